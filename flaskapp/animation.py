@@ -0,0 +1,112 @@
+"""
+Анимация сдвига по контурам.
+
+Кадр k - изображение, сдвинутое на k шагов. Перестановка одного шага
+строится один раз (из кэша планов), а каждый следующий кадр получается
+применением ее к предыдущему, без пересчета карты контуров.
+
+Для GIF изображение квантуется в палитру один раз: сдвиг только
+переставляет пиксели, поэтому сдвигаются сами индексы палитры, и все
+кадры используют одну общую палитру.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image, features
+
+from ring_shift import apply_permutation, plan_cache, transform_shifts
+
+
+class AnimationFormat:
+    """Формат анимации: формат Pillow, MIME-тип и параметры сохранения."""
+
+    def __init__(self, name, format, mimetype, params=None, feature=None):
+        self.name = name
+        self.format = format
+        self.mimetype = mimetype
+        self.params = params or {}
+        self.feature = feature
+
+    def available(self):
+        return self.feature is None or bool(features.check(self.feature))
+
+
+ANIMATION_FORMATS = {
+    'gif': AnimationFormat('gif', 'GIF', 'image/gif', {'optimize': False}),
+    'apng': AnimationFormat('apng', 'PNG', 'image/apng', {'compress_level': 1}),
+    'webp': AnimationFormat('webp', 'WEBP', 'image/webp', {'lossless': True, 'method': 0},
+                            feature='webp'),
+}
+
+
+def to_8bit(image_array):
+    """
+    Форматы анимации хранят 8 бит на канал. Целые данные сужаются по
+    своему фактическому диапазону: значения до 65535 (16-битный PNG,
+    в том числе декодированный в режим 'I' int32) - сдвигом на 8 бит,
+    больший диапазон - линейно. Данные с плавающей точкой: [0, 1] или [0, 255].
+    """
+    if image_array.dtype == np.uint8:
+        return image_array
+    if image_array.dtype.kind in 'ui':
+        low, high = int(image_array.min(initial=0)), int(image_array.max(initial=0))
+        if low >= 0 and high <= 255 and image_array.dtype.itemsize == 1:
+            return image_array.astype(np.uint8)
+        if low >= 0 and high <= 65535:
+            return (image_array >> 8).astype(np.uint8)
+        scale = 255 / max(high - low, 1)
+        return ((image_array.astype(np.float64) - low) * scale).astype(np.uint8)
+    upper = 1.0 if image_array.size and image_array.max() <= 1.0 else 255.0
+    return np.clip(image_array * (255.0 / upper), 0, 255).astype(np.uint8)
+
+
+def iter_frames(image_array, shift_pixels, frames, mode='constant', clockwise=True, inverse=False):
+    """
+    Генератор кадров: исходное изображение и frames - 1 последовательных
+    сдвигов на шаг shift_pixels (режим, направление и обратное
+    преобразование - как в ring_shift.ring_shifts).
+    """
+    h, w = image_array.shape[:2]
+    plan = plan_cache.get(h, w, transform_shifts(h, w, shift_pixels, mode, clockwise, inverse))
+
+    frame = image_array
+    for _ in range(frames):
+        yield frame
+        frame = apply_permutation(frame, plan)
+
+
+def encode_animation(image_array, shift_pixels, frames, format='gif', duration=100,
+                     mode='constant', clockwise=True, inverse=False):
+    """Кодирует frames кадров анимации в байты формата format (см. ANIMATION_FORMATS)."""
+    animation = ANIMATION_FORMATS[format]
+    image_array = to_8bit(image_array)
+
+    palette = None
+    params = dict(animation.params)
+    if format == 'gif' and image_array.ndim == 3:
+        image = Image.fromarray(image_array)
+        alpha = None
+        if image.mode in ('LA', 'RGBA'):
+            alpha = np.asarray(image.getchannel('A'))
+            image = image.convert('RGB')
+        quantized = image.quantize(256 if alpha is None else 255)
+        palette = quantized.getpalette()
+        image_array = np.asarray(quantized)
+        if alpha is not None:
+            # GIF хранит прозрачность одним индексом палитры: он сдвигается
+            # вместе с остальными индексами
+            image_array = np.where(alpha < 128, 255, image_array).astype(np.uint8)
+            params.update(transparency=255, disposal=2)
+
+    images = []
+    for frame in iter_frames(image_array, shift_pixels, frames, mode, clockwise, inverse):
+        image = Image.fromarray(frame)
+        if palette is not None:
+            image.putpalette(palette)
+        images.append(image)
+
+    buffered = io.BytesIO()
+    images[0].save(buffered, format=animation.format, save_all=True, append_images=images[1:],
+                   duration=duration, loop=0, **params)
+    return buffered.getvalue()
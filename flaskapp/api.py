@@ -0,0 +1,357 @@
+"""
+Машинный REST API сдвига изображения.
+
+POST /api/v1/shift - изображение в теле запроса (сырые байты или поле
+multipart 'image'), параметр ?shift=N. Ответ - результат в формате,
+выбранном через ?format=png|webp|webp-lossy|jpeg|raw|auto или заголовок
+Accept (image/png, image/webp, image/jpeg, application/octet-stream);
+по умолчанию формат совпадает с форматом загруженного файла. При
+Accept: application/json возвращается статистика результата. Параметр
+?max_size=N уменьшает изображение до N пикселей по большей стороне
+перед сдвигом (отрицательное значение - 400). Обобщенный сдвиг задают
+?mode=constant|proportional|array (для array - список ?shifts=1,2,3 по
+контурам, начиная с внешнего), ?direction=cw|ccw и ?inverse=1 (см.
+ring_shift.ring_shifts). Изображения больше MAX_IMAGE_PIXELS
+отклоняются с 413, изображения от OUT_OF_CORE_MIN_PIXELS
+обрабатываются вне памяти (см. out_of_core) и отдаются только потоком:
+PNG (в том числе для ?format=auto) или raw; остальные форматы
+кодируются лишь целиком в памяти, поэтому для таких изображений
+возвращается 406.
+
+POST /api/v1/stats - гистограммы загруженного изображения в JSON.
+
+POST /api/v1/animate - анимация последовательных сдвигов на ?shift=N
+(те же mode/shifts/direction/inverse): ?frames=K кадров с длительностью
+?duration=мс в формате ?format=gif|apng|webp; изображение уменьшается
+до ANIMATION_MAX_SIZE (или ?max_size=N) по большей стороне.
+
+Ответы /api/v1/shift (кроме сырых пикселей) кэшируются по содержимому
+загрузки и параметрам и несут ETag; при совпадении If-None-Match
+возвращается 304 без тела.
+"""
+
+import io
+import json
+
+from flask import Blueprint, Response, current_app, jsonify, request
+from PIL import Image, UnidentifiedImageError, features
+
+from histogram import compute_histogram, histogram_to_dict
+from animation import ANIMATION_FORMATS, encode_animation
+from imaging import (OUTPUT_ENCODINGS, ImageTooLarge, array_mode, choose_encoding, encoder_params,
+                     image_to_array, iter_encoded, iter_raw, make_preview, open_image, png_supports)
+from metrics import set_labels, timed
+from operations import get_operation, parse_shift_pixels
+from out_of_core import iter_scratch_png, shift_to_scratch
+from result_cache import content_key, result_cache
+from ring_shift import transform_shifts
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Форматы ответа, выбираемые по заголовку Accept
+MIMETYPE_FORMATS = {
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/jpeg': 'jpeg',
+    'application/octet-stream': 'raw',
+    'application/json': 'json',
+}
+
+# Все значения ?format=: кодировки изображений, сырые пиксели, статистика
+# и 'auto' - формат загруженного файла
+FORMATS = set(OUTPUT_ENCODINGS) | {'raw', 'json', 'auto'}
+
+SHIFT_MODES = ('constant', 'proportional', 'array')
+DIRECTIONS = {'cw': True, 'ccw': False}
+
+
+class ApiError(Exception):
+    """Ошибка запроса, возвращаемая клиенту в виде JSON."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api.errorhandler(ApiError)
+def handle_api_error(e):
+    return jsonify({'error': e.message}), e.status
+
+
+def read_upload_bytes():
+    """Байты изображения из поля 'image' или из тела запроса."""
+    if 'image' in request.files:
+        data = request.files['image'].read()
+    else:
+        data = request.get_data()
+    if not data:
+        raise ApiError('Изображение не передано')
+    return data
+
+
+def upload_stream():
+    """Поток с изображением из поля 'image' или из тела запроса."""
+    if 'image' in request.files:
+        return request.files['image'].stream
+    data = request.get_data()
+    if not data:
+        raise ApiError('Изображение не передано')
+    return io.BytesIO(data)
+
+
+def open_upload(stream=None, draft_size=None):
+    """
+    Открывает изображение (по умолчанию - из запроса), проверяя бюджет
+    пикселей MAX_IMAGE_PIXELS по заголовку до декодирования.
+    """
+    if stream is None:
+        stream = upload_stream()
+    try:
+        return open_image(stream, current_app.config['MAX_IMAGE_PIXELS'], draft_size)
+    except ImageTooLarge as e:
+        raise ApiError(f'Изображение слишком большое: {e}', 413)
+    except (UnidentifiedImageError, OSError) as e:
+        raise ApiError(f'Не удалось прочитать изображение: {e}')
+
+
+def read_image(img):
+    """Декодирует открытое изображение в массив пикселей."""
+    try:
+        return image_to_array(img)
+    except OSError as e:
+        raise ApiError(f'Не удалось прочитать изображение: {e}')
+
+
+def cached_response(key, body, mimetype, headers, cache_status):
+    response = Response(body, mimetype=mimetype, headers=headers)
+    response.set_etag(key)
+    response.headers['X-Cache'] = cache_status
+    return response
+
+
+def iter_and_cache(key, mimetype, chunks):
+    """Отдает порции ответа и по завершении кладет их целиком в кэш."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    result_cache.put(key, (mimetype, b''.join(parts)))
+
+
+def negotiate_format():
+    """
+    Формат ответа: параметр ?format= важнее заголовка Accept,
+    без обоих (или при Accept: */*) формат выбирается по входному файлу.
+    """
+    name = request.args.get('format')
+    if name is not None:
+        if name not in FORMATS:
+            raise ApiError(f'Неизвестный формат: {name}')
+        return name
+    if not request.accept_mimetypes or request.accept_mimetypes.best == '*/*':
+        return 'auto'
+
+    mimetype = request.accept_mimetypes.best_match(list(MIMETYPE_FORMATS))
+    if mimetype is None:
+        raise ApiError('Нет подходящего формата ответа', 406)
+    return MIMETYPE_FORMATS[mimetype]
+
+
+def int_arg(name, default):
+    try:
+        return int(request.args.get(name, default))
+    except ValueError:
+        raise ApiError(f'Параметр {name} должен быть целым числом')
+
+
+def size_arg(name, default):
+    """Неотрицательный целый параметр размера (0 - без ограничения)."""
+    value = int_arg(name, default)
+    if value < 0:
+        raise ApiError(f'Параметр {name} не может быть отрицательным')
+    return value
+
+
+def parse_transform():
+    """
+    Параметры обобщенного сдвига: (mode, shifts, clockwise, inverse),
+    где shifts - кортеж сдвигов по контурам для режима array.
+    """
+    mode = request.args.get('mode', 'constant')
+    if mode not in SHIFT_MODES:
+        raise ApiError(f'Неизвестный режим сдвига: {mode}')
+    direction = request.args.get('direction', 'cw')
+    if direction not in DIRECTIONS:
+        raise ApiError(f'Неизвестное направление: {direction}')
+    inverse = request.args.get('inverse', '0').lower() in ('1', 'true', 'yes')
+
+    shifts = ()
+    if mode == 'array':
+        try:
+            shifts = tuple(int(value) for value in request.args.get('shifts', '').split(','))
+        except ValueError:
+            raise ApiError('Параметр shifts - список целых чисел через запятую')
+    return mode, shifts, DIRECTIONS[direction], inverse
+
+
+def resolve_shifts(h, w, shift_pixels, transform):
+    """Сдвиг для размера h x w (число или массив по контурам, см. transform_shifts)."""
+    mode, shifts, clockwise, inverse = transform
+    try:
+        return transform_shifts(h, w, shifts if mode == 'array' else shift_pixels, mode, clockwise, inverse)
+    except ValueError as e:
+        raise ApiError(str(e))
+
+
+def image_stats(image_array, **extra):
+    h, w = image_array.shape[:2]
+    return dict(extra,
+                width=w,
+                height=h,
+                channels=1 if image_array.ndim == 2 else image_array.shape[2],
+                dtype=image_array.dtype.name,
+                histogram=histogram_to_dict(compute_histogram(image_array)))
+
+
+@api.route('/shift', methods=['POST'])
+def shift():
+    output = negotiate_format()
+    if output.startswith('webp') and not features.check('webp'):
+        raise ApiError('WebP не поддерживается сервером', 406)
+
+    stream = upload_stream()
+    shift_pixels = parse_shift_pixels(request.args.get('shift', request.form.get('shift')))
+    headers = {'X-Shift-Pixels': str(shift_pixels)}
+    max_size = size_arg('max_size', 0)
+    transform = parse_transform()
+
+    # Готовый результат для тех же байтов и параметров берется из кэша
+    # (сырые пиксели не кэшируются - их выдача дешевле хранения)
+    key = None
+    if output != 'raw':
+        key = content_key(stream, 'api/shift', shift_pixels, output, max_size, *transform)
+        if request.if_none_match.contains(key):
+            response = cached_response(key, None, None, headers, 'hit')
+            response.status_code = 304
+            return response
+        cached = result_cache.get(key)
+        if cached is not None:
+            if output == 'json':
+                return cached_response(key, json.dumps(cached), 'application/json', headers, 'hit')
+            mimetype, body = cached
+            return cached_response(key, body, mimetype, headers, 'hit')
+
+    # Для уменьшенного результата JPEG декодируется с масштабированием DCT
+    with timed('open'):
+        img = open_upload(stream, draft_size=max_size)
+        input_format = img.format
+        if max_size:
+            img = make_preview(img, max_size)
+    set_labels(img.width, img.height, shift_pixels)
+    shifts = resolve_shifts(img.height, img.width, shift_pixels, transform)
+    # Очень большие изображения обрабатываются вне памяти (np.memmap),
+    # кроме статистики, которой нужны все пиксели сразу
+    config = current_app.config
+    out_of_core = output != 'json' and img.width * img.height >= config['OUT_OF_CORE_MIN_PIXELS']
+    if out_of_core:
+        if output == 'auto':
+            output = 'png'
+        elif output not in ('png', 'raw'):
+            raise ApiError(f'Изображение {img.width}x{img.height} отдается только в форматах png и raw', 406)
+        with timed('shift'):
+            try:
+                result_array = shift_to_scratch(img, shifts, config['UPLOAD_FOLDER'])
+            except OSError as e:
+                raise ApiError(f'Не удалось прочитать изображение: {e}')
+    else:
+        with timed('decode'):
+            image_array = read_image(img)
+        with timed('shift'):
+            result_array = get_operation('ring_shift')(image_array, shifts)
+
+    if output == 'json':
+        stats = image_stats(result_array, shift_pixels=shift_pixels)
+        result_cache.put(key, stats)
+        return cached_response(key, json.dumps(stats), 'application/json', headers, 'miss')
+
+    if output == 'raw':
+        h, w = result_array.shape[:2]
+        headers.update({
+            'X-Image-Width': str(w),
+            'X-Image-Height': str(h),
+            'X-Image-Channels': str(1 if result_array.ndim == 2 else result_array.shape[2]),
+            'X-Image-Dtype': result_array.dtype.str,
+            'Content-Length': str(result_array.nbytes),
+        })
+        return Response(iter_raw(result_array), mimetype='application/octet-stream', headers=headers)
+
+    mode = array_mode(result_array)
+    encoding = choose_encoding(mode, input_format, output)
+    if output != 'auto' and encoding.name != output:
+        raise ApiError(f'Формат {output} не поддерживает режим изображения {mode}', 406)
+
+    # PNG из отображенного файла кодируется полосами и не кэшируется:
+    # целиком в памяти он не помещается в бюджет
+    if out_of_core:
+        if not png_supports(result_array):
+            raise ApiError(f'Режим {mode} не кодируется в PNG потоком, используйте format=raw', 406)
+        body = iter_scratch_png(result_array, config['PNG_COMPRESS_LEVEL'], config['PNG_STRATEGY'])
+        return cached_response(key, body, encoding.mimetype, headers, 'miss')
+
+    result_image = Image.fromarray(result_array)
+    params = encoder_params(encoding, config['PNG_COMPRESS_LEVEL'], config['PNG_STRATEGY'])
+    body = iter_and_cache(key, encoding.mimetype, iter_encoded(result_image, encoding.format, **params))
+    return cached_response(key, body, encoding.mimetype, headers, 'miss')
+
+
+@api.route('/stats', methods=['POST'])
+def stats():
+    return jsonify(image_stats(read_image(open_upload())))
+
+
+@api.route('/animate', methods=['POST'])
+def animate():
+    name = request.args.get('format', 'gif')
+    animation = ANIMATION_FORMATS.get(name)
+    if animation is None:
+        raise ApiError(f'Неизвестный формат анимации: {name}')
+    if not animation.available():
+        raise ApiError(f'Анимация {name} не поддерживается сервером', 406)
+
+    config = current_app.config
+    shift_pixels = parse_shift_pixels(request.args.get('shift'))
+    frames = int_arg('frames', 30)
+    if not 1 <= frames <= config['ANIMATION_MAX_FRAMES']:
+        raise ApiError(f"Число кадров должно быть от 1 до {config['ANIMATION_MAX_FRAMES']}")
+    duration = max(int_arg('duration', 100), 10)
+    max_size = min(size_arg('max_size', config['ANIMATION_MAX_SIZE']) or config['ANIMATION_MAX_SIZE'],
+                   config['ANIMATION_MAX_SIZE'])
+    mode, shifts, clockwise, inverse = parse_transform()
+
+    stream = upload_stream()
+    key = content_key(stream, 'api/animate', name, shift_pixels, frames, duration, max_size,
+                      mode, shifts, clockwise, inverse)
+    headers = {'X-Shift-Pixels': str(shift_pixels), 'X-Frames': str(frames)}
+    if request.if_none_match.contains(key):
+        response = cached_response(key, None, None, headers, 'hit')
+        response.status_code = 304
+        return response
+    cached = result_cache.get(key)
+    if cached is not None:
+        mimetype, body = cached
+        return cached_response(key, body, mimetype, headers, 'hit')
+
+    with timed('open'):
+        img = make_preview(open_upload(stream, draft_size=max_size), max_size)
+    set_labels(img.width, img.height, shift_pixels)
+    with timed('decode'):
+        image_array = read_image(img)
+    with timed('encode'):
+        try:
+            body = encode_animation(image_array, shifts if mode == 'array' else shift_pixels, frames,
+                                    name, duration, mode, clockwise, inverse)
+        except ValueError as e:
+            raise ApiError(str(e))
+    result_cache.put(key, (animation.mimetype, body))
+    return cached_response(key, body, animation.mimetype, headers, 'miss')
@@ -0,0 +1,6 @@
+from async_adapter import AsyncWsgiAdapter
+from some_app import app as flask_app
+
+# Асинхронный режим: uvicorn asgi:app или
+# gunicorn --config gunicorn.conf.py --worker-class uvicorn.workers.UvicornWorker asgi:app
+app = AsyncWsgiAdapter(flask_app)
@@ -0,0 +1,238 @@
+"""
+Запуск WSGI-приложения под ASGI-сервером (uvicorn) без блокировки на сети.
+
+Под синхронными воркерами gunicorn медленный клиент занимает воркер на
+все время передачи: и пока загружает изображение, и пока читает большой
+HTML с base64. Адаптер разделяет сеть и вычисления:
+
+    - тело запроса принимается в цикле событий (до UPLOAD_SPOOL_THRESHOLD
+      в памяти, дальше - во временном файле UPLOAD_FOLDER), и только
+      полностью полученный запрос передается приложению;
+    - приложение (декодирование, сдвиг, кодирование) выполняется в
+      ограниченном пуле из ASYNC_WORKERS потоков;
+    - ответ отдается по порциям: поток пула занят только на время
+      вычисления очередной порции, а ожидание медленного клиента
+      происходит в цикле событий.
+
+Одновременно обслуживается не больше ASYNC_MAX_REQUESTS запросов;
+остальные ждут до ASYNC_QUEUE_TIMEOUT секунд и получают 503. Тело
+больше MAX_CONTENT_LENGTH отклоняется с 413, а запрос с некорректным
+Content-Length - с 400 до вызова приложения.
+"""
+
+import asyncio
+import contextvars
+import json
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+
+class RequestTooLarge(Exception):
+    """Тело запроса больше MAX_CONTENT_LENGTH."""
+
+
+class MalformedRequest(Exception):
+    """Некорректный заголовок Content-Length."""
+
+
+class ClientDisconnected(Exception):
+    """Клиент закрыл соединение до окончания загрузки."""
+
+
+class AsyncWsgiAdapter:
+    """
+    ASGI-приложение поверх Flask-приложения app; параметры берутся из
+    app.config (ASYNC_WORKERS, ASYNC_MAX_REQUESTS, ASYNC_QUEUE_TIMEOUT,
+    MAX_CONTENT_LENGTH, UPLOAD_SPOOL_THRESHOLD, UPLOAD_FOLDER).
+    """
+
+    def __init__(self, app):
+        config = app.config
+        self.app = app
+        self.max_requests = config['ASYNC_MAX_REQUESTS']
+        self.queue_timeout = config['ASYNC_QUEUE_TIMEOUT']
+        self.max_body = config['MAX_CONTENT_LENGTH']
+        self.spool_threshold = config['UPLOAD_SPOOL_THRESHOLD']
+        self.spool_dir = config['UPLOAD_FOLDER']
+        self.executor = ThreadPoolExecutor(max_workers=config['ASYNC_WORKERS'],
+                                           thread_name_prefix='asgi')
+        self._slots = None
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        app.extensions['async_adapter'] = self
+
+    def stats(self):
+        with self._lock:
+            return {'active': self.active, 'waiting': self.waiting, 'rejected': self.rejected}
+
+    def _count(self, name, delta):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.handle(scope, receive, send)
+        else:
+            raise ValueError(f"Неподдерживаемый тип соединения: {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle(self, scope, receive, send):
+        try:
+            body = await self.receive_body(scope, receive)
+        except RequestTooLarge:
+            await send_json(send, 413, {'error': 'Слишком большой запрос'})
+            return
+        except MalformedRequest:
+            await send_json(send, 400, {'error': 'Некорректный заголовок Content-Length'})
+            return
+        except ClientDisconnected:
+            return
+
+        with body:
+            if self._slots is None:
+                self._slots = asyncio.Semaphore(self.max_requests)
+            self._count('waiting', 1)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._count('rejected', 1)
+                await send_json(send, 503, {'error': 'Сервер перегружен, повторите позже'},
+                                [(b'retry-after', b'1')])
+                return
+            finally:
+                self._count('waiting', -1)
+
+            self._count('active', 1)
+            try:
+                await self.run_app(scope, body, send)
+            finally:
+                self._count('active', -1)
+                self._slots.release()
+
+    async def receive_body(self, scope, receive):
+        """Принимает тело запроса, не занимая поток: память, затем временный файл."""
+        for name, value in scope['headers']:
+            if name == b'content-length':
+                if not value.isdigit():
+                    raise MalformedRequest()
+                if self.max_body and int(value) > self.max_body:
+                    raise RequestTooLarge()
+
+        body = tempfile.SpooledTemporaryFile(max_size=self.spool_threshold, mode='w+b',
+                                             dir=self.spool_dir)
+        size = 0
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    raise ClientDisconnected()
+                chunk = message.get('body', b'')
+                size += len(chunk)
+                if self.max_body and size > self.max_body:
+                    raise RequestTooLarge()
+                body.write(chunk)
+                if not message.get('more_body', False):
+                    break
+        except BaseException:
+            body.close()
+            raise
+        body.seek(0)
+        return body
+
+    async def run_app(self, scope, body, send):
+        loop = asyncio.get_running_loop()
+        # Все вызовы приложения для запроса идут в одном контексте: генераторы
+        # stream_with_context держат контекст Flask между порциями ответа
+        context = contextvars.copy_context()
+
+        def call(func, *args):
+            return loop.run_in_executor(self.executor, context.run, func, *args)
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return lambda data: None
+
+        result = await call(self.app, wsgi_environ(scope, body), start_response)
+        try:
+            chunks = iter(result)
+            # Заголовки известны после первой порции (start_response может
+            # вызываться лениво, при первой итерации)
+            chunk = await call(next, chunks, _DONE)
+            response['sent'] = True
+            await send({'type': 'http.response.start', 'status': response['status'],
+                        'headers': response['headers']})
+            while chunk is not _DONE:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await call(next, chunks, _DONE)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await call(result.close)
+
+
+def wsgi_environ(scope, body):
+    """Окружение WSGI для HTTP-запроса ASGI с уже полученным телом body."""
+    body.seek(0, 2)
+    length = body.tell()
+    body.seek(0)
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(length),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def send_json(send, status, data, headers=()):
+    payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(payload)).encode('ascii')), *headers]})
+    await send({'type': 'http.response.body', 'body': payload})
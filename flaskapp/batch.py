@@ -0,0 +1,191 @@
+"""
+Пакетная обработка: несколько изображений и/или несколько сдвигов за
+один запрос.
+
+POST /api/v1/batch - multipart с одним или несколькими полями 'image'
+(или одно изображение в теле запроса) и списком сдвигов ?shift=1,5,10
+(поле формы 'shift' можно повторять). Каждое изображение декодируется
+один раз, карта контуров строится один раз на размер, а результаты
+отдаются потоком по мере готовности:
+
+    ?container=zip       - ZIP-архив (по умолчанию), в конце manifest.json;
+    ?container=multipart - multipart/mixed, у каждой части заголовки
+                           X-Item-Index и X-Item-Status, последняя часть -
+                           manifest.json.
+
+Формат изображений задается ?format=png|webp|webp-lossy|jpeg|auto.
+Ошибка в одном файле не прерывает пакет: в манифесте у элемента
+status='error' и текст ошибки.
+"""
+
+import io
+import json
+import os
+import uuid
+import zipfile
+
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from PIL import Image, UnidentifiedImageError, features
+from werkzeug.utils import secure_filename
+
+from api import ApiError, handle_api_error
+from imaging import (OUTPUT_ENCODINGS, ImageTooLarge, choose_encoding, encode_image, encoder_params,
+                     image_to_array, open_image)
+from operations import parse_shift_pixels
+from ring_shift import apply_ring_shifts
+
+batch = Blueprint('batch', __name__, url_prefix='/api/v1/batch')
+batch.register_error_handler(ApiError, handle_api_error)
+
+CONTAINERS = ('zip', 'multipart')
+
+
+class _ZipStream(io.RawIOBase):
+    """
+    Приемник zipfile без перемотки: записанные байты копятся до вызова
+    pop(), поэтому архив отдается клиенту по частям.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def parse_shifts():
+    """Список сдвигов из ?shift=1,5,10 и/или повторяющихся полей 'shift'."""
+    values = request.args.getlist('shift') + request.form.getlist('shift')
+    shifts = []
+    for value in values or [None]:
+        for part in (value.split(',') if value else [None]):
+            shift_pixels = parse_shift_pixels(part)
+            if shift_pixels not in shifts:
+                shifts.append(shift_pixels)
+    return shifts
+
+
+def uploads():
+    """
+    Пары (имя, байты) загруженных изображений. Байты читаются сразу:
+    файлы запроса закрываются при выходе из представления, а ответ
+    формируется позже (общий объем ограничен MAX_CONTENT_LENGTH).
+    """
+    files = request.files.getlist('image')
+    if files:
+        return [(f.filename or f'image{i}', f.read()) for i, f in enumerate(files)]
+    data = request.get_data()
+    if not data:
+        raise ApiError('Изображения не переданы')
+    return [('image', data)]
+
+
+def process_items(files, shifts, output, max_pixels, png_level, png_strategy):
+    """
+    Генератор (элемент манифеста, mimetype, байты) по всем парам
+    файл x сдвиг. Для ошибочного элемента байты - None.
+    """
+    index = 0
+    for file_index, (filename, data) in enumerate(files):
+        stem = os.path.splitext(secure_filename(filename))[0] or f'image{file_index}'
+        try:
+            img = open_image(io.BytesIO(data), max_pixels)
+            input_format = img.format
+            image_array = image_to_array(img)
+        except (ImageTooLarge, UnidentifiedImageError, OSError) as e:
+            for shift_pixels in shifts:
+                yield {'index': index, 'file': filename, 'shift_pixels': shift_pixels,
+                       'status': 'error', 'error': str(e)}, None, None
+                index += 1
+            continue
+
+        for shift_pixels, result_array in apply_ring_shifts(image_array, shifts):
+            item = {'index': index, 'file': filename, 'shift_pixels': shift_pixels}
+            index += 1
+            try:
+                result_image = Image.fromarray(result_array)
+                encoding = choose_encoding(result_image.mode, input_format, output)
+                if output != 'auto' and encoding.name != output:
+                    raise ValueError(f'Формат {output} не поддерживает режим изображения {result_image.mode}')
+                body = encode_image(result_image, encoding,
+                                    **encoder_params(encoding, png_level, png_strategy))
+            except (ValueError, OSError) as e:
+                yield dict(item, status='error', error=str(e)), None, None
+                continue
+            name = f'{item["index"]:04d}_{stem}_shift{shift_pixels}.{encoding.format.lower()}'
+            yield dict(item, status='ok', name=name, mimetype=encoding.mimetype), encoding.mimetype, body
+
+
+def iter_zip(items):
+    """Потоковый ZIP без сжатия (изображения уже сжаты) с manifest.json в конце."""
+    sink = _ZipStream()
+    manifest = []
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for item, mimetype, body in items:
+            manifest.append(item)
+            if body is not None:
+                archive.writestr(item['name'], body)
+                yield sink.pop()
+        archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=1))
+    yield sink.pop()
+
+
+def iter_multipart(items, boundary):
+    """Потоковый multipart/mixed: часть на элемент и manifest.json в конце."""
+    manifest = []
+    for item, mimetype, body in items:
+        manifest.append(item)
+        headers = [f'X-Item-Index: {item["index"]}', f'X-Item-Status: {item["status"]}']
+        if body is None:
+            mimetype = 'application/json'
+            body = json.dumps(item, ensure_ascii=False).encode('utf-8')
+        else:
+            headers.append(f'Content-Disposition: attachment; filename="{item["name"]}"')
+        headers.insert(0, f'Content-Type: {mimetype}')
+        yield (f'--{boundary}\r\n' + '\r\n'.join(headers) + '\r\n\r\n').encode('utf-8')
+        yield body
+        yield b'\r\n'
+
+    yield (f'--{boundary}\r\nContent-Type: application/json\r\n'
+           f'Content-Disposition: attachment; filename="manifest.json"\r\n\r\n').encode('utf-8')
+    yield json.dumps(manifest, ensure_ascii=False).encode('utf-8')
+    yield f'\r\n--{boundary}--\r\n'.encode('utf-8')
+
+
+@batch.route('', methods=['POST'])
+def run_batch():
+    container = request.args.get('container', 'zip')
+    if container not in CONTAINERS:
+        raise ApiError(f'Неизвестный контейнер: {container}')
+    output = request.args.get('format', 'auto')
+    if output != 'auto' and output not in OUTPUT_ENCODINGS:
+        raise ApiError(f'Неизвестный формат: {output}')
+    if output.startswith('webp') and not features.check('webp'):
+        raise ApiError('WebP не поддерживается сервером', 406)
+
+    files = uploads()
+    shifts = parse_shifts()
+    config = current_app.config
+    if len(files) * len(shifts) > config['BATCH_MAX_ITEMS']:
+        raise ApiError(f'Слишком много элементов в пакете (не более {config["BATCH_MAX_ITEMS"]})', 413)
+
+    items = process_items(files, shifts, output, config['MAX_IMAGE_PIXELS'],
+                          config['PNG_COMPRESS_LEVEL'], config['PNG_STRATEGY'])
+    headers = {'X-Batch-Items': str(len(files) * len(shifts))}
+    if container == 'zip':
+        headers['Content-Disposition'] = 'attachment; filename="batch.zip"'
+        return Response(stream_with_context(iter_zip(items)), mimetype='application/zip', headers=headers)
+
+    boundary = uuid.uuid4().hex
+    return Response(stream_with_context(iter_multipart(items, boundary)),
+                    content_type=f'multipart/mixed; boundary={boundary}', headers=headers)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Сравнение синхронного и асинхронного развертывания при медленных клиентах.
+
+Запускает по очереди два сервера с одинаковым числом воркеров:
+
+    sync  - gunicorn с синхронными воркерами (wsgi:app, как в Procfile);
+    async - gunicorn с воркерами uvicorn (asgi:app, см. async_adapter).
+
+Пока --slow-uploaders клиентов медленно загружают изображение
+(--slow-rate байт/с), а --slow-readers клиентов медленно читают HTML
+страницы /process, генератор нагрузки из load_test.py отправляет
+--requests обычных запросов к /api/v1/shift. Для каждого развертывания
+печатаются пропускная способность и задержки p50/p95/p99 обычных
+запросов; --json сохраняет оба отчета.
+
+Пример:
+    python bench_async.py --workers 2 --slow-uploaders 4 --slow-readers 4
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from load_test import LoadClient, run_load, summarize, synthetic_png
+
+DEPLOYMENTS = {
+    'sync': ['gunicorn', '--config', 'gunicorn.conf.py', 'wsgi:app'],
+    'async': ['gunicorn', '--config', 'gunicorn.conf.py',
+              '--worker-class', 'uvicorn.workers.UvicornWorker', 'asgi:app'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(command, port, workers):
+    """Запускает сервер и ждет /readyz; возвращает процесс."""
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers))
+    process = subprocess.Popen(command + ['--bind', f'127.0.0.1:{port}'], env=env,
+                               cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Сервер завершился с кодом {process.returncode}: {' '.join(command)}")
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/readyz', timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('Сервер не стал готов за 60 с')
+
+
+def slow_upload(port, image_data, rate, stop):
+    """Загружает изображение порциями со скоростью rate байт/с, пока не stop."""
+    while not stop.is_set():
+        with socket.create_connection(('127.0.0.1', port), timeout=120) as sock:
+            sock.sendall(b'POST /api/v1/shift?shift=5&format=png HTTP/1.1\r\n'
+                         b'Host: 127.0.0.1\r\nContent-Type: application/octet-stream\r\n'
+                         b'Connection: close\r\n'
+                         b'Content-Length: ' + str(len(image_data)).encode('ascii') + b'\r\n\r\n')
+            chunk = max(rate // 10, 1)
+            for start in range(0, len(image_data), chunk):
+                if stop.is_set():
+                    return
+                sock.sendall(image_data[start:start + chunk])
+                time.sleep(0.1)
+            while sock.recv(65536):
+                pass
+
+
+def slow_read(port, image_data, rate, stop):
+    """Запрашивает страницу /process и читает ответ со скоростью rate байт/с."""
+    while not stop.is_set():
+        response = requests.post(f'http://127.0.0.1:{port}/process',
+                                 files={'image': ('slow.png', image_data, 'image/png')},
+                                 data={'shift_pixels': 10}, stream=True, timeout=120)
+        for _ in response.iter_content(max(rate // 10, 1)):
+            if stop.is_set():
+                break
+            time.sleep(0.1)
+        response.close()
+
+
+def run_deployment(name, args, image_data):
+    port = free_port()
+    process = start_server(DEPLOYMENTS[name], port, args.workers)
+    stop = threading.Event()
+    slow = [threading.Thread(target=slow_upload, args=(port, image_data, args.slow_rate, stop), daemon=True)
+            for _ in range(args.slow_uploaders)]
+    slow += [threading.Thread(target=slow_read, args=(port, image_data, args.slow_rate, stop), daemon=True)
+             for _ in range(args.slow_readers)]
+    try:
+        client = LoadClient(f'http://127.0.0.1:{port}', 'api', image_data, args.timeout)
+        run_load(client, args.warmup, args.concurrency, repeat_shift=True)
+        for thread in slow:
+            thread.start()
+        # Медленные клиенты успевают занять соединения
+        time.sleep(1)
+        results, wall_time = run_load(client, args.requests, args.concurrency, repeat_shift=False)
+    finally:
+        stop.set()
+        process.terminate()
+        process.wait(timeout=30)
+
+    report = summarize(results, wall_time)
+    report.update(deployment=name, workers=args.workers, slow_uploaders=args.slow_uploaders,
+                  slow_readers=args.slow_readers, concurrency=args.concurrency)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--deployments', nargs='+', choices=list(DEPLOYMENTS), default=list(DEPLOYMENTS))
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--slow-uploaders', type=int, default=4)
+    parser.add_argument('--slow-readers', type=int, default=4)
+    parser.add_argument('--slow-rate', type=int, default=64 * 1024, help='скорость медленного клиента, байт/с')
+    parser.add_argument('--size', default='1280x960', help='размер синтетического изображения')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--json', help='сохранить отчеты в JSON')
+    args = parser.parse_args()
+
+    if shutil.which('gunicorn') is None:
+        sys.exit('Нужен gunicorn (и uvicorn для async): pip install -r requirements.txt')
+
+    w, h = (int(v) for v in args.size.lower().split('x'))
+    image_data = synthetic_png(w, h)
+
+    reports = []
+    print(f"{'развертывание':<14} {'запр/с':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'ошибок':>7}")
+    for name in args.deployments:
+        report = run_deployment(name, args, image_data)
+        reports.append(report)
+        latencies = [f"{report[p] * 1000:>9.1f}" if p in report else f"{'-':>9}" for p in ('p50', 'p95', 'p99')]
+        print(f"{name:<14} {report['throughput']:>8.1f} {' '.join(latencies)} {report['errors']:>7}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    main()
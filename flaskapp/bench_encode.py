@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк кодирования результата: время кодирования против размера
+файла для форматов вывода и настроек сжатия PNG.
+
+Пример:
+    python bench_encode.py --image photo.jpg
+    python bench_encode.py --size 1920x1080 --png-levels 1 6 9
+"""
+
+import argparse
+import time
+
+import numpy as np
+from PIL import Image
+
+from imaging import OUTPUT_ENCODINGS, PNG_STRATEGIES, encode_image, encoder_params
+
+
+def synthetic_photo(w, h):
+    """Плавные градиенты с шумом - ближе к фотографии, чем чистый шум."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    base = np.stack([x / w, y / h, (x + y) / (w + h)], axis=2) * 200
+    noise = rng.normal(0, 4, (h, w, 3))
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8))
+
+
+def options(png_levels, png_strategies):
+    """Пары (подпись, кодировка, параметры) для всех вариантов."""
+    for level in png_levels:
+        for strategy in png_strategies:
+            encoding = OUTPUT_ENCODINGS['png']
+            yield f'png level={level} {strategy}', encoding, encoder_params(encoding, level, strategy)
+    for name in ('webp', 'webp-lossy', 'jpeg'):
+        encoding = OUTPUT_ENCODINGS[name]
+        yield name, encoding, encoder_params(encoding)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', help='файл изображения (по умолчанию - синтетическое)')
+    parser.add_argument('--size', default='1920x1080', help='размер синтетического изображения')
+    parser.add_argument('--png-levels', nargs='+', type=int, default=[1, 3, 6, 9])
+    parser.add_argument('--png-strategies', nargs='+', choices=sorted(PNG_STRATEGIES),
+                        default=['default', 'rle', 'filtered'])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.image:
+        image = Image.open(args.image).convert('RGB')
+    else:
+        w, h = (int(v) for v in args.size.lower().split('x'))
+        image = synthetic_photo(w, h)
+
+    raw_size = image.width * image.height * len(image.getbands())
+    print(f"Изображение {image.width}x{image.height}, несжатый размер {raw_size / 1024:.0f} КБ")
+    print(f"{'вариант':<28} {'время, мс':>10} {'размер, КБ':>11} {'сжатие':>7}")
+
+    for label, encoding, params in options(args.png_levels, args.png_strategies):
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            data = encode_image(image, encoding, **params)
+            best = min(best, time.perf_counter() - start)
+        print(f"{label:<28} {best * 1000:>10.1f} {len(data) / 1024:>11.0f} {raw_size / len(data):>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
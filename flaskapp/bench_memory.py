@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пикового потребления памяти (RSS): полный конвейер сдвига
+крупного изображения в памяти против режима out_of_core (np.memmap).
+
+Каждый режим запускается в отдельном процессе, пиковый RSS берется из
+getrusage. Строка 'baseline' - процесс, который только импортирует модули.
+
+Пример:
+    python bench_memory.py --size 8000x6000
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+MODES = ('baseline', 'memory', 'out-of-core')
+
+
+def write_source(path, w, h):
+    """Синтетический RGB PNG, записанный полосами (без копии в памяти)."""
+    from imaging import iter_png
+
+    rows = np.linspace(0, 255, w, dtype=np.uint8)
+    image = np.lib.format.open_memmap(path + '.npy', mode='w+', dtype=np.uint8, shape=(h, w, 3))
+    for top in range(0, h, 256):
+        band = image[top:top + 256]
+        band[...] = rows[None, :, None]
+        band[..., 1] = (np.arange(top, top + band.shape[0]) % 256).astype(np.uint8)[:, None]
+    with open(path, 'wb') as f:
+        for data in iter_png(image, 1):
+            f.write(data)
+    del image
+    os.remove(path + '.npy')
+
+
+def run(mode, path, shift_pixels):
+    """Выполняется в дочернем процессе; печатает пиковый RSS (МБ) и время."""
+    from PIL import Image
+
+    from imaging import encode_image, image_to_array, open_image, OUTPUT_ENCODINGS
+    from out_of_core import iter_scratch_png, shift_to_scratch
+    from ring_shift import apply_ring_shift
+
+    start = time.perf_counter()
+    size = 0
+    if mode == 'memory':
+        img = open_image(path, max_pixels=sys.maxsize)
+        result = apply_ring_shift(image_to_array(img), shift_pixels)
+        size = len(encode_image(Image.fromarray(result), OUTPUT_ENCODINGS['png'], compress_level=1))
+    elif mode == 'out-of-core':
+        img = open_image(path, max_pixels=sys.maxsize)
+        result = shift_to_scratch(img, shift_pixels, os.path.dirname(path))
+        size = sum(len(data) for data in iter_scratch_png(result, 1))
+    elapsed = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{peak:.1f} {elapsed:.3f} {size}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='6000x4000', help='размер синтетического изображения')
+    parser.add_argument('--shift', type=int, default=10)
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.child[0], args.child[1], args.shift)
+        return
+
+    w, h = (int(v) for v in args.size.lower().split('x'))
+    raw_mb = w * h * 3 / 1024 / 1024
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'source.png')
+        write_source(path, w, h)
+        print(f"Изображение {w}x{h} RGB, пиксели {raw_mb:.0f} МБ, файл "
+              f"{os.path.getsize(path) / 1024 / 1024:.1f} МБ")
+        print(f"{'режим':<12} {'пик RSS, МБ':>12} {'к пикселям':>11} {'время, с':>9}")
+
+        for mode in MODES:
+            output = subprocess.run([sys.executable, __file__, '--shift', str(args.shift),
+                                     '--child', mode, path],
+                                    check=True, capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+            peak, elapsed, _ = output.split()
+            print(f"{mode:<12} {float(peak):>12.0f} {float(peak) / raw_mb:>10.2f}x {float(elapsed):>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сдвига по прямоугольному контуру: исходная реализация с циклами
+против векторизованного движка ring_shift.
+
+Пример:
+    python bench_shift.py --sizes 200x200 640x480 1920x1080 --shifts 1 10 500
+
+С параметром --workers измеряется масштабирование по числу потоков
+(построение перестановки и ее применение) на крупных изображениях:
+    python bench_shift.py --workers 1 2 4 8 --sizes 5472x3648
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ring_shift import (apply_permutation, build_ring_map, shift_executor,
+                        shift_image_rectangular, shift_image_rectangular_loop)
+
+
+def parse_size(text):
+    w, h = text.lower().split('x')
+    return int(w), int(h)
+
+
+def best_time(func, *args, repeat=3):
+    """Минимальное время из нескольких запусков и результат последнего."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_scaling(args):
+    """Время построения и применения перестановки при разном числе потоков."""
+    rng = np.random.default_rng(0)
+    print(f"{'размер':>12} {'потоки':>6} {'план, с':>10} {'сдвиг, с':>10} {'ускорение':>10}  совпадение")
+
+    for w, h in args.sizes:
+        shape = (h, w) if args.channels == 1 else (h, w, args.channels)
+        image = rng.integers(0, 256, shape, dtype=np.uint8)
+        ring_map = build_ring_map(h, w)
+        baseline = None
+
+        for workers in args.workers:
+            shift_executor.configure(workers)
+            plan_time, perm = best_time(ring_map.source_indices, args.shifts[0], repeat=args.repeat)
+            apply_time, result = best_time(apply_permutation, image, perm, repeat=args.repeat)
+
+            if baseline is None:
+                baseline = (plan_time + apply_time, result)
+            print(f"{f'{w}x{h}':>12} {workers:>6} {plan_time:>10.4f} {apply_time:>10.4f} "
+                  f"{baseline[0] / (plan_time + apply_time):>9.2f}x  "
+                  f"{'да' if np.array_equal(baseline[1], result) else 'НЕТ'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=parse_size,
+                        default=[(200, 200), (640, 480), (1280, 960), (1920, 1080)])
+    parser.add_argument('--shifts', nargs='+', type=int, default=[1, 10, 1000])
+    parser.add_argument('--channels', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--loop-max-pixels', type=int, default=2_500_000,
+                        help='не запускать медленную реализацию на больших изображениях')
+    parser.add_argument('--workers', nargs='+', type=int,
+                        help='измерить масштабирование по числу потоков')
+    args = parser.parse_args()
+
+    if args.workers:
+        bench_scaling(args)
+        return
+
+    rng = np.random.default_rng(0)
+    print(f"{'размер':>12} {'сдвиг':>6} {'циклы, с':>10} {'вектор, с':>10} {'ускорение':>10}  совпадение")
+
+    for w, h in args.sizes:
+        shape = (h, w) if args.channels == 1 else (h, w, args.channels)
+        image = rng.random(shape, dtype=np.float32)
+
+        for shift in args.shifts:
+            fast_time, fast = best_time(shift_image_rectangular, image, shift, repeat=args.repeat)
+
+            if w * h <= args.loop_max_pixels:
+                loop_time, reference = best_time(shift_image_rectangular_loop, image, shift, repeat=1)
+                same = reference.dtype == fast.dtype and np.array_equal(reference, fast)
+                print(f"{f'{w}x{h}':>12} {shift:>6} {loop_time:>10.4f} {fast_time:>10.4f} "
+                      f"{loop_time / fast_time:>9.1f}x  {'да' if same else 'НЕТ'}")
+            else:
+                print(f"{f'{w}x{h}':>12} {shift:>6} {'-':>10} {fast_time:>10.4f} {'-':>10}  -")
+
+
+if __name__ == '__main__':
+    main()
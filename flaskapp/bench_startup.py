@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк запуска воркера: время от старта интерпретатора до готовности
+приложения (импорт wsgi и синхронный прогрев), в отдельных процессах.
+
+    import        - импорт wsgi без прогрева (WARMUP=off);
+    ready         - импорт с синхронным прогревом (WARMUP=sync), так
+                    мастер gunicorn с preload_app готовит процесс к fork;
+    pyplot        - для сравнения: один импорт matplotlib.pyplot.
+
+Завершается с кодом 1, если медиана 'ready' превышает --target секунд.
+
+Пример:
+    python bench_startup.py --repeat 5 --target 1.0
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Целевое время готовности воркера (секунд)
+TARGET_SECONDS = 1.0
+
+SCENARIOS = {
+    'import': ('import wsgi', {'WARMUP': 'off'}),
+    'ready': ('import wsgi', {'WARMUP': 'sync'}),
+    'pyplot': ('import matplotlib.pyplot', {}),
+}
+
+
+def run_once(code, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True,
+                   env=dict(os.environ, **env), cwd=os.path.dirname(os.path.abspath(__file__)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--target', type=float, default=TARGET_SECONDS,
+                        help='допустимая медиана времени готовности (с)')
+    args = parser.parse_args()
+
+    print(f"{'сценарий':<10} {'медиана, с':>11} {'мин, с':>8} {'макс, с':>8}")
+    medians = {}
+    for name, (code, env) in SCENARIOS.items():
+        times = [run_once(code, env) for _ in range(args.repeat)]
+        medians[name] = statistics.median(times)
+        print(f"{name:<10} {medians[name]:>11.3f} {min(times):>8.3f} {max(times):>8.3f}")
+
+    ok = medians['ready'] <= args.target
+    print(f"\nГотовность воркера: {medians['ready']:.3f} с, цель {args.target:.3f} с - "
+          f"{'в пределах' if ok else 'ПРЕВЫШЕНА'}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
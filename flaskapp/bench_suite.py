@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Набор микробенчмарков для отслеживания регрессий: сдвиг по контурам
+(публичная shift_image_rectangular, движок с холодным и теплым кэшем
+планов) и построение гистограмм (прежний create_color_plot на matplotlib
+и render_histogram_png) по размерам, числу каналов и значениям сдвига.
+
+Результаты печатаются таблицей и сохраняются в JSON (--json) вместе с
+версиями библиотек; --compare сравнивает с сохраненным прогоном и
+завершается с кодом 1, если какой-то случай медленнее на --tolerance.
+
+Пример:
+    python bench_suite.py --json baseline.json
+    python bench_suite.py --compare baseline.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import PIL
+
+from histogram import compute_histogram, render_histogram_png
+from ring_shift import apply_ring_shift, plan_cache, shift_image_rectangular
+
+
+def parse_size(text):
+    w, h = text.lower().split('x')
+    return int(w), int(h)
+
+
+def measure(func, repeat, setup=None):
+    """Лучшее и среднее время repeat запусков; setup вызывается перед каждым."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times), sum(times) / len(times)
+
+
+def shift_cases(args, rng):
+    for w, h in args.sizes:
+        for channels in args.channels:
+            shape = (h, w) if channels == 1 else (h, w, channels)
+            image = rng.integers(0, 256, shape, dtype=np.uint8)
+            for shift in args.shifts:
+                params = {'size': f'{w}x{h}', 'channels': channels, 'shift': shift}
+                yield 'shift_image_rectangular', params, lambda: shift_image_rectangular(image, shift), None
+                yield 'ring_shift_cold', params, lambda: apply_ring_shift(image, shift), plan_cache.clear
+                apply_ring_shift(image, shift)
+                yield 'ring_shift_warm', params, lambda: apply_ring_shift(image, shift), None
+
+
+def histogram_cases(args, rng):
+    # Импорт приложения нужен только для прежних графиков matplotlib
+    from some_app import create_color_plot
+
+    for w, h in args.sizes:
+        for channels in args.channels:
+            shape = (h, w) if channels == 1 else (h, w, channels)
+            image = rng.integers(0, 256, shape, dtype=np.uint8)
+            params = {'size': f'{w}x{h}', 'channels': channels}
+            yield 'compute_histogram', params, lambda: compute_histogram(image), None
+            yield 'render_histogram_png', params, lambda: render_histogram_png(compute_histogram(image)), None
+            if not args.skip_matplotlib:
+                yield 'create_color_plot', params, lambda: create_color_plot(image, 'Бенчмарк'), None
+
+
+def case_id(name, params):
+    return name + ' ' + ' '.join(f'{key}={value}' for key, value in params.items())
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pillow': PIL.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, path, tolerance):
+    """Печатает изменения относительно сохраненного прогона; True - регрессий нет."""
+    with open(path, encoding='utf-8') as f:
+        baseline = {case_id(r['name'], r['params']): r['best'] for r in json.load(f)['results']}
+
+    ok = True
+    print(f"\nСравнение с {path} (допуск {tolerance:.0%}):")
+    for result in results:
+        key = case_id(result['name'], result['params'])
+        if key not in baseline:
+            continue
+        ratio = result['best'] / baseline[key]
+        if ratio > 1 + tolerance:
+            ok = False
+            print(f"  РЕГРЕССИЯ {key}: {baseline[key] * 1000:.2f} -> {result['best'] * 1000:.2f} мс ({ratio:.2f}x)")
+        elif ratio < 1 - tolerance:
+            print(f"  ускорение {key}: {baseline[key] * 1000:.2f} -> {result['best'] * 1000:.2f} мс ({ratio:.2f}x)")
+    if ok:
+        print("  регрессий нет")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=parse_size,
+                        default=[(200, 200), (640, 480), (1920, 1080)])
+    parser.add_argument('--channels', nargs='+', type=int, default=[1, 3, 4])
+    parser.add_argument('--shifts', nargs='+', type=int, default=[1, 10, 500])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', choices=['shift', 'histogram'], help='только одна группа')
+    parser.add_argument('--skip-matplotlib', action='store_true', help='без create_color_plot')
+    parser.add_argument('--json', help='сохранить результаты в JSON')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    groups = []
+    if args.only in (None, 'shift'):
+        groups.append(shift_cases(args, rng))
+    if args.only in (None, 'histogram'):
+        groups.append(histogram_cases(args, rng))
+
+    results = []
+    print(f"{'случай':<68} {'лучшее, мс':>11} {'среднее, мс':>12}")
+    for cases in groups:
+        for name, params, func, setup in cases:
+            best, mean = measure(func, args.repeat, setup)
+            results.append({'name': name, 'params': params, 'best': best, 'mean': mean,
+                            'repeat': args.repeat})
+            print(f"{case_id(name, params):<68} {best * 1000:>11.2f} {mean * 1000:>12.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': results}, f, ensure_ascii=False, indent=1)
+        print(f"\nРезультаты сохранены в {args.json}")
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,82 @@
 import requests
 import base64
 import json
+import os
+import zipfile
+
+BASE_URL = 'http://127.0.0.1:5000'
+
+class ShiftClient:
+    """Программный клиент API сдвига (/api/v1)"""
+    
+    def __init__(self, base_url=BASE_URL, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+    
+    def shift(self, image_data, shift_pixels=10, output_format='png'):
+        """
+        Возвращает байты сдвинутого изображения в формате output_format
+        (png, webp, webp-lossy, jpeg, auto - как у исходного файла,
+        или raw - сырые пиксели, размеры в заголовках X-Image-*).
+        """
+        response = self._post('/api/v1/shift', image_data,
+                              params={'shift': shift_pixels, 'format': output_format})
+        return response.content
+    
+    def shift_to_file(self, image_data, path, shift_pixels=10, output_format='png'):
+        """Сохраняет результат в файл, читая ответ порциями"""
+        response = self._post('/api/v1/shift', image_data, stream=True,
+                              params={'shift': shift_pixels, 'format': output_format})
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+    
+    def shift_stats(self, image_data, shift_pixels=10):
+        """Статистика (гистограммы) результата сдвига"""
+        response = self._post('/api/v1/shift', image_data, params={'shift': shift_pixels},
+                              headers={'Accept': 'application/json'})
+        return response.json()
+    
+    def stats(self, image_data):
+        """Статистика (гистограммы) исходного изображения"""
+        return self._post('/api/v1/stats', image_data).json()
+    
+    def batch(self, paths, shifts=(10,), output_format='auto', path='batch.zip'):
+        """
+        Пакетная обработка файлов paths со всеми сдвигами shifts.
+        ZIP-архив с результатами и manifest.json сохраняется в path,
+        возвращается манифест (статус каждого элемента).
+        """
+        files = [('image', (os.path.basename(p), open(p, 'rb'))) for p in paths]
+        try:
+            response = self.session.post(self.base_url + '/api/v1/batch', files=files, stream=True,
+                                         params={'shift': ','.join(map(str, shifts)),
+                                                 'format': output_format},
+                                         timeout=self.timeout)
+        finally:
+            for _, (_, f) in files:
+                f.close()
+        if response.status_code != 200:
+            raise RuntimeError(f"Ошибка API {response.status_code}: {response.text[:500]}")
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+        with zipfile.ZipFile(path) as archive:
+            return json.loads(archive.read('manifest.json'))
+    
+    def _post(self, path, image_data, **kwargs):
+        response = self.session.post(self.base_url + path, data=image_data,
+                                     headers=dict({'Content-Type': 'application/octet-stream'},
+                                                  **kwargs.pop('headers', {})),
+                                     timeout=self.timeout, **kwargs)
+        if response.status_code != 200:
+            try:
+                message = response.json()['error']
+            except ValueError:
+                message = response.text[:500]
+            raise RuntimeError(f"Ошибка API {response.status_code}: {message}")
+        return response
 
 def test_local():
     """Тестирование локального сервера"""
@@ -44,6 +120,20 @@ def test_local():
             
     except Exception as e:
         print(f"✗ Ошибка при тестировании API: {e}")
+    
+    # 3. Тестируем машинный API
+    print("\nТестирование /api/v1/shift...")
+    client = ShiftClient()
+    try:
+        result = client.shift(image_data, shift_pixels=20)
+        with open('test_result.png', 'wb') as f:
+            f.write(result)
+        print(f"✓ Результат сохранен в test_result.png ({len(result)} байт)")
+        
+        stats = client.shift_stats(image_data, shift_pixels=20)
+        print(f"✓ Статистика: {stats['width']}x{stats['height']}, каналов: {stats['channels']}")
+    except Exception as e:
+        print(f"✗ Ошибка при тестировании /api/v1/shift: {e}")
 
 if __name__ == "__main__":
     test_local()
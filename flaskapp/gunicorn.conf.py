@@ -0,0 +1,25 @@
+"""
+Конфигурация gunicorn (Procfile: gunicorn --config gunicorn.conf.py wsgi:app).
+
+Приложение загружается и прогревается один раз в мастер-процессе
+(preload_app, WARMUP=sync), после чего воркеры создаются через fork и
+разделяют страницы памяти с уже импортированными модулями, планами
+сдвига и скомпилированными шаблонами. Воркер готов сразу после fork.
+"""
+
+import gc
+import os
+
+# Прогрев до fork: воркеры наследуют прогретый процесс
+os.environ.setdefault('WARMUP', 'sync')
+preload_app = True
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = 120
+
+
+def when_ready(server):
+    # Объекты, созданные при загрузке, больше не просматриваются сборщиком
+    # мусора, и его проходы в воркерах не копируют разделяемые страницы
+    gc.freeze()
+    server.log.info('Приложение загружено и прогрето в мастер-процессе')
@@ -0,0 +1,104 @@
+"""
+Прогрев процесса и проверки живости/готовности.
+
+Прогрев прогоняет маленькое изображение через весь конвейер: модули
+Pillow, построение плана сдвига, гистограммы, кодирование PNG и
+компиляция шаблонов (и matplotlib с кэшем шрифтов, если он нужен).
+Первый настоящий запрос после этого не платит за инициализацию.
+
+GET /healthz - процесс жив (всегда 200).
+GET /readyz  - 200, когда прогрев завершен, иначе 503; в ответе время
+               создания приложения и прогрева.
+"""
+
+import io
+import threading
+import time
+
+import numpy as np
+from flask import Blueprint, current_app, jsonify
+from PIL import Image
+
+from histogram import compute_histogram, plot_lock, pyplot, render_histogram_png
+from imaging import OUTPUT_ENCODINGS, encode_image
+from operations import get_operation
+
+health = Blueprint('health', __name__)
+
+WARMUP_MODES = ('background', 'sync', 'off')
+
+
+class WarmupState:
+    """Состояние прогрева приложения (app.extensions['warmup'])."""
+
+    def __init__(self, startup_seconds):
+        self.startup_seconds = startup_seconds
+        self.warmup_seconds = None
+        self.error = None
+        self.done = threading.Event()
+
+    def info(self):
+        return {
+            'ready': self.done.is_set() and self.error is None,
+            'startup_seconds': round(self.startup_seconds, 4),
+            'warmup_seconds': None if self.warmup_seconds is None else round(self.warmup_seconds, 4),
+            'error': self.error,
+        }
+
+
+def warm_up(app):
+    """Прогоняет маленькое изображение через все этапы обработки."""
+    Image.init()
+    image = np.random.default_rng(0).integers(0, 256, (64, 48, 3), dtype=np.uint8)
+    result = get_operation('ring_shift')(image, 10)
+    render_histogram_png(compute_histogram(result))
+    encode_image(Image.fromarray(result), OUTPUT_ENCODINGS['png'])
+
+    for name in ('index.html', 'result.html'):
+        app.jinja_env.get_template(name)
+
+    if app.config['WARMUP_MATPLOTLIB'] or app.config['HISTOGRAM_RENDERER'] == 'matplotlib':
+        # Импорт pyplot и построение кэша шрифтов - самая долгая часть
+        with plot_lock:
+            plt = pyplot()
+            fig, ax = plt.subplots(figsize=(4, 3))
+            ax.hist(result[:, :, 0].ravel(), bins=256)
+            ax.set_title('Прогрев')
+            fig.savefig(io.BytesIO(), format='png')
+            plt.close(fig)
+
+
+def start_warmup(app, startup_seconds):
+    """Запускает прогрев согласно WARMUP и сохраняет состояние в app.extensions."""
+    mode = app.config['WARMUP']
+    if mode not in WARMUP_MODES:
+        raise ValueError(f'Неизвестный режим прогрева: {mode}')
+    state = app.extensions['warmup'] = WarmupState(startup_seconds)
+
+    def run():
+        start = time.perf_counter()
+        try:
+            if mode != 'off':
+                warm_up(app)
+        except Exception as e:
+            state.error = str(e)
+            app.logger.exception('Ошибка прогрева')
+        state.warmup_seconds = time.perf_counter() - start
+        state.done.set()
+
+    if mode == 'background':
+        threading.Thread(target=run, name='warmup', daemon=True).start()
+    else:
+        run()
+    return state
+
+
+@health.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+
+@health.route('/readyz')
+def readyz():
+    info = current_app.extensions['warmup'].info()
+    return jsonify(info), 200 if info['ready'] else 503
@@ -0,0 +1,134 @@
+"""
+Гистограммы распределения цветов без matplotlib.
+
+Счетчики по каналам считаются через np.bincount прямо по буферу
+изображения (срез с шагом по каналам, без копий flatten), после чего
+отдаются как JSON для отрисовки на клиенте или рисуются в легкий PNG
+средствами Pillow.
+"""
+
+import base64
+import io
+import threading
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Число столбцов гистограммы (интенсивность 0-255)
+BINS = 256
+
+CHANNEL_NAMES = {
+    1: ['Gray'],
+    2: ['Gray', 'Alpha'],
+    3: ['Red', 'Green', 'Blue'],
+    4: ['Red', 'Green', 'Blue', 'Alpha'],
+}
+
+CHANNEL_COLORS = {
+    'Gray': (128, 128, 128),
+    'Red': (220, 40, 40),
+    'Green': (40, 160, 40),
+    'Blue': (40, 80, 220),
+    'Alpha': (128, 40, 160),
+}
+
+# Размер панели одного канала в PNG
+PANEL_WIDTH = 2 * BINS
+PANEL_HEIGHT = 120
+PANEL_MARGIN = 20
+
+
+def channel_names(channels):
+    return CHANNEL_NAMES.get(channels, [f'Channel {i}' for i in range(channels)])
+
+
+def _channel_counts(values, dtype):
+    """Счетчики одного канала, сведенные к BINS столбцам."""
+    if dtype.kind in 'ui' and dtype.itemsize == 1:
+        return np.bincount(values, minlength=BINS)
+
+    if dtype.kind in 'ui':
+        # 16-битные данные: 65536 значений группируются по 256 в столбец
+        counts = np.bincount(values, minlength=BINS * 256)
+        if counts.size > BINS * 256:
+            counts[BINS * 256 - 1] += counts[BINS * 256:].sum()
+        return counts[:BINS * 256].reshape(BINS, 256).sum(axis=1)
+
+    # Данные с плавающей точкой: [0, 1] или [0, 255]
+    upper = 1.0 if values.max() <= 1.0 else 255.0
+    counts, _ = np.histogram(values, bins=BINS, range=(0.0, upper))
+    return counts
+
+
+def compute_histogram(image_array):
+    """
+    Возвращает массив счетчиков формы (каналы, BINS).
+    Каналы читаются из общего буфера срезами с шагом, без копирования.
+    """
+    channels = 1 if image_array.ndim == 2 else image_array.shape[2]
+    flat = image_array.reshape(-1)
+
+    return np.stack([
+        _channel_counts(flat[c::channels], image_array.dtype)
+        for c in range(channels)
+    ])
+
+
+def histogram_to_dict(counts):
+    """Представление гистограммы для JSON (отрисовка на клиенте)."""
+    return {
+        'bins': counts.shape[1],
+        'channels': [
+            {
+                'name': name,
+                'color': '#%02x%02x%02x' % CHANNEL_COLORS.get(name, (0, 0, 0)),
+                'counts': channel.tolist(),
+            }
+            for name, channel in zip(channel_names(counts.shape[0]), counts)
+        ],
+    }
+
+
+def render_histogram_png(counts):
+    """
+    Рисует гистограмму (по панели на канал) и возвращает PNG в base64.
+    """
+    names = channel_names(counts.shape[0])
+    panel_step = PANEL_HEIGHT + PANEL_MARGIN
+    canvas = np.full((panel_step * len(names) + PANEL_MARGIN, PANEL_WIDTH, 3), 255, dtype=np.uint8)
+
+    rows = np.arange(PANEL_HEIGHT, 0, -1)[:, None]
+    for i, (name, channel) in enumerate(zip(names, counts)):
+        peak = channel.max()
+        heights = channel * PANEL_HEIGHT / peak if peak else np.zeros(BINS)
+
+        # Столбец бина занимает два пикселя по ширине
+        bars = np.repeat(heights, PANEL_WIDTH // BINS)[None, :] >= rows
+        top = PANEL_MARGIN + i * panel_step
+        panel = canvas[top:top + PANEL_HEIGHT]
+        panel[bars] = CHANNEL_COLORS.get(name, (0, 0, 0))
+        panel[-1] = 0
+
+    img = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(img)
+    for i, name in enumerate(names):
+        draw.text((4, 4 + i * panel_step), name, fill=(0, 0, 0))
+
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', compress_level=1)
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+
+# pyplot хранит глобальное состояние и не потокобезопасен
+plot_lock = threading.Lock()
+
+
+def pyplot():
+    """
+    matplotlib.pyplot загружается при первом построении графика: импорт
+    стоит сотни миллисекунд, которые иначе платил бы каждый воркер.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
@@ -0,0 +1,337 @@
+"""
+Декодирование и кодирование изображений.
+"""
+
+import io
+import queue
+import struct
+import threading
+import zlib
+
+import numpy as np
+from PIL import Image
+
+# Режимы PIL, пиксели которых обрабатываются без преобразования:
+# 8-битные grayscale/RGB (в том числе с альфа-каналом) и 16-битные grayscale PNG
+NATIVE_MODES = {'L', 'LA', 'RGB', 'RGBA', 'I', 'I;16', 'I;16B', 'I;16L'}
+
+# Бюджет пикселей декодируемого изображения по умолчанию (около 50 Мп)
+DEFAULT_MAX_PIXELS = 50_000_000
+
+# Размер полосы строк, переносимой из декодированного изображения в массив (байт)
+DECODE_STRIP_BYTES = 4 * 1024 * 1024
+
+# Размер порции при потоковой отдаче закодированного изображения
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Размер полосы строк потокового кодировщика PNG (байт) и типы цвета PNG
+# по числу каналов: grayscale, grayscale + alpha, RGB, RGBA
+PNG_STRIP_BYTES = 1024 * 1024
+PNG_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+
+
+# Стратегии zlib для PNG (параметр compress_type кодировщика Pillow)
+PNG_STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+
+
+class OutputEncoding:
+    """Формат вывода: формат PIL, MIME-тип, параметры и допустимые режимы."""
+
+    def __init__(self, name, format, mimetype, params=None, modes=None):
+        self.name = name
+        self.format = format
+        self.mimetype = mimetype
+        self.params = params or {}
+        self.modes = modes
+
+    def supports(self, mode):
+        return self.modes is None or mode in self.modes
+
+
+OUTPUT_ENCODINGS = {
+    'png': OutputEncoding('png', 'PNG', 'image/png'),
+    'webp': OutputEncoding('webp', 'WEBP', 'image/webp',
+                           {'lossless': True, 'method': 0}, {'RGB', 'RGBA'}),
+    'webp-lossy': OutputEncoding('webp-lossy', 'WEBP', 'image/webp',
+                                 {'quality': 85, 'method': 4}, {'RGB', 'RGBA'}),
+    'jpeg': OutputEncoding('jpeg', 'JPEG', 'image/jpeg',
+                           {'quality': 90}, {'L', 'RGB'}),
+}
+
+# Формат вывода по умолчанию для формата загруженного файла
+INPUT_ENCODINGS = {
+    'JPEG': 'jpeg',
+    'WEBP': 'webp',
+}
+
+
+def choose_encoding(mode, input_format=None, requested='auto'):
+    """
+    Формат вывода: запрошенный явно или, для 'auto', тот же, что у входного
+    файла. Если формат не умеет хранить режим изображения - PNG.
+    """
+    if requested == 'auto':
+        requested = INPUT_ENCODINGS.get(input_format, 'png')
+    encoding = OUTPUT_ENCODINGS[requested]
+    if not encoding.supports(mode):
+        encoding = OUTPUT_ENCODINGS['png']
+    return encoding
+
+
+def encoder_params(encoding, png_compress_level=6, png_strategy='default'):
+    """Параметры кодировщика с учетом настроек сжатия PNG."""
+    params = dict(encoding.params)
+    if encoding.format == 'PNG':
+        params['compress_level'] = png_compress_level
+        params['compress_type'] = PNG_STRATEGIES[png_strategy]
+    return params
+
+
+def encode_image(image, encoding, **params):
+    """Кодирует изображение целиком и возвращает байты."""
+    buffered = io.BytesIO()
+    image.save(buffered, format=encoding.format, **params)
+    return buffered.getvalue()
+
+
+def make_preview(image, max_size):
+    """
+    Уменьшенная копия изображения, вписанная в квадрат max_size.
+    Сначала выполняется быстрое целочисленное уменьшение (reduce),
+    затем точная билинейная подгонка размера.
+    """
+    scale = max_size / max(image.size)
+    if not max_size or scale >= 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    resample = Image.BILINEAR if image.mode in ('L', 'RGB', 'RGBA', 'LA') else Image.NEAREST
+    return image.resize(size, resample, reducing_gap=2.0)
+
+
+class ImageTooLarge(Exception):
+    """Изображение превышает бюджет пикселей (возможная «декомпрессионная бомба»)."""
+
+
+def open_image(stream, max_pixels=DEFAULT_MAX_PIXELS, draft_size=None):
+    """
+    Открывает изображение, читая только заголовок, и проверяет бюджет
+    пикселей до выделения памяти под декодирование. Если нужна лишь
+    уменьшенная копия (draft_size), JPEG декодируется с масштабированием
+    DCT (в 2-8 раз дешевле по памяти и времени).
+    """
+    try:
+        img = Image.open(stream)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+
+    if draft_size and img.format == 'JPEG':
+        img.draft(img.mode, (draft_size, draft_size))
+
+    if img.width * img.height > max_pixels:
+        raise ImageTooLarge(f'{img.width}x{img.height} пикселей превышает бюджет {max_pixels}')
+    return img
+
+
+def decode_to_array(img, allocate=np.empty, strip_bytes=DECODE_STRIP_BYTES):
+    """
+    Декодирует изображение сразу в заранее выделенный массив NumPy.
+    np.asarray(img) собирает промежуточную копию всех байтов (tobytes),
+    здесь же пиксели переносятся полосами строк (Image.crop и
+    np.asarray полосы), и лишняя память ограничена одной полосой.
+    allocate(shape, dtype) создает массив (например, np.memmap во
+    временном файле).
+    """
+    img.load()
+    # Тип и число каналов - как у np.asarray(img), по одному пикселю
+    sample = np.asarray(img.crop((0, 0, 1, 1)))
+    out = allocate((img.height, img.width) + sample.shape[2:], sample.dtype)
+    if out.size == 0:
+        return out
+
+    rows = max(1, strip_bytes // max(out[0].nbytes, 1))
+    for top in range(0, img.height, rows):
+        bottom = min(top + rows, img.height)
+        out[top:bottom] = np.asarray(img.crop((0, top, img.width, bottom)))
+    return out
+
+
+def array_mode(array):
+    """Режим PIL, который получит Image.fromarray(array), без копии пикселей."""
+    return Image.fromarray(array[:1, :1]).mode
+
+
+def native_mode(img):
+    """
+    Режим, к которому приводится изображение не из NATIVE_MODES: прозрачность
+    (альфа-канал, в том числе предумноженный, или прозрачный цвет палитры)
+    сохраняется как LA/RGBA, остальное (P, CMYK, YCbCr...) - RGB.
+    """
+    if img.mode == '1':
+        return 'L'
+    alpha = bool({'A', 'a'} & set(img.getbands())) or 'transparency' in img.info
+    if img.mode == 'La':
+        return 'LA'
+    return 'RGBA' if alpha else 'RGB'
+
+
+def image_to_array(img, allocate=np.empty):
+    """
+    Массив пикселей изображения без нормализации во float: uint8 для
+    L/LA/RGB/RGBA (каналы, включая альфа, чередуются в одном буфере),
+    16-битные данные PNG сохраняют свою разрядность. Остальные режимы
+    приводятся к native_mode(img).
+    """
+    if img.mode not in NATIVE_MODES:
+        img = img.convert(native_mode(img))
+    return decode_to_array(img, allocate)
+
+
+class EncodingCancelled(Exception):
+    """Получатель потока перестал читать данные (например, клиент отключился)."""
+
+
+class _ChunkWriter:
+    """
+    Файлоподобный объект для Image.save: собирает записи в порции
+    и передает их в очередь, блокируясь, пока получатель не заберет данные.
+    """
+
+    def __init__(self, chunks, cancelled, chunk_size):
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self._chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def _put(self, item):
+        while not self._cancelled.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise EncodingCancelled()
+
+
+def iter_encoded(image, format, chunk_size=STREAM_CHUNK_SIZE, **params):
+    """
+    Генератор порций закодированного изображения. Кодировщик работает
+    в отдельном потоке, поэтому первые байты уходят клиенту до окончания
+    кодирования, а в памяти держится лишь несколько порций.
+    """
+    chunks = queue.Queue(maxsize=4)
+    cancelled = threading.Event()
+    finished = object()
+
+    def encode():
+        writer = _ChunkWriter(chunks, cancelled, chunk_size)
+        try:
+            image.save(writer, format=format, **params)
+            writer.flush()
+            writer._put(finished)
+        except EncodingCancelled:
+            pass
+        except Exception as e:
+            try:
+                writer._put(e)
+            except EncodingCancelled:
+                pass
+
+    threading.Thread(target=encode, daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is finished:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+
+
+def png_sample_dtype(array):
+    """
+    Тип отсчетов PNG (big-endian) для массива или None, если iter_png его
+    не запишет. Подходят uint8/uint16 с 1-4 каналами, а также grayscale
+    int32 (режим 'I', в который Pillow декодирует 16-битные PNG) со
+    значениями в диапазоне 0..65535.
+    """
+    channels = 1 if array.ndim == 2 else array.shape[2]
+    if channels not in PNG_COLOR_TYPES:
+        return None
+    if array.dtype == np.uint8 or array.dtype.kind == 'u' and array.dtype.itemsize == 2:
+        return array.dtype.newbyteorder('>')
+    if array.dtype.kind == 'i' and channels == 1 and array.size \
+            and array.min() >= 0 and array.max() <= 65535:
+        return np.dtype('>u2')
+    return None
+
+
+def png_supports(array):
+    """Может ли iter_png записать массив (см. png_sample_dtype)."""
+    return png_sample_dtype(array) is not None
+
+
+def iter_png(array, compress_level=6, strategy='default', strip_bytes=PNG_STRIP_BYTES):
+    """
+    Потоковое кодирование PNG прямо из массива (в т.ч. np.memmap)
+    полосами строк: в памяти держатся только текущая полоса и состояние
+    zlib, а не все изображение, как при Image.save. Строки кодируются
+    фильтром Up (разность с предыдущей строкой).
+    """
+    h, w = array.shape[:2]
+    channels = 1 if array.ndim == 2 else array.shape[2]
+    sample = png_sample_dtype(array)
+    depth = 8 * sample.itemsize
+    row_bytes = w * channels * sample.itemsize
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    yield b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, depth,
+                                                             PNG_COLOR_TYPES[channels], 0, 0, 0))
+
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, zlib.MAX_WBITS, 9,
+                                  PNG_STRATEGIES[strategy])
+    rows = max(1, strip_bytes // max(row_bytes, 1))
+    previous = np.zeros(row_bytes, dtype=np.uint8)
+    for top in range(0, h, rows):
+        # PNG хранит 16-битные отсчеты в порядке big-endian
+        strip = np.ascontiguousarray(array[top:top + rows], dtype=sample)
+        strip = strip.view(np.uint8).reshape(-1, row_bytes)
+
+        filtered = np.empty((strip.shape[0], row_bytes + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        np.subtract(strip[0], previous, out=filtered[0, 1:])
+        np.subtract(strip[1:], strip[:-1], out=filtered[1:, 1:])
+        previous = strip[-1].copy()
+
+        data = compressor.compress(filtered)
+        if data:
+            yield chunk(b'IDAT', data)
+
+    yield chunk(b'IDAT', compressor.flush()) + chunk(b'IEND', b'')
+
+
+def iter_raw(array, chunk_size=STREAM_CHUNK_SIZE):
+    """Порции сырых байтов массива пикселей (без копирования всего буфера)."""
+    data = memoryview(np.ascontiguousarray(array).reshape(-1).view(np.uint8))
+    for start in range(0, len(data), chunk_size):
+        yield bytes(data[start:start + chunk_size])
@@ -0,0 +1,351 @@
+"""
+Асинхронный режим обработки крупных изображений.
+
+POST /jobs ставит сдвиг в очередь локального пула процессов и сразу
+возвращает идентификатор задания. Клиент опрашивает GET /jobs/<id>
+(с ?wait=N - длинный опрос до N секунд) и забирает результат через
+GET /jobs/<id>/result.
+
+Очередь ограничена по глубине (при переполнении - 429), у каждого
+задания есть таймаут (процесс задания, не успевшего за JOB_TIMEOUT,
+завершается), а готовые результаты удаляются через
+JOB_RESULT_TTL секунд. Очередь своя у каждого процесса сервера, поэтому
+опрашивать задание нужно у того же воркера (например, один воркер
+gunicorn с пулом процессов внутри).
+"""
+
+import io
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent import futures
+
+from flask import Blueprint, Response, current_app, jsonify, request, url_for
+from PIL import Image
+
+from api import ApiError, handle_api_error, open_upload, read_upload_bytes
+from histogram import compute_histogram, histogram_to_dict
+from imaging import OUTPUT_ENCODINGS, encoder_params, image_to_array, open_image
+from operations import get_operation, parse_shift_pixels
+
+jobs = Blueprint('jobs', __name__, url_prefix='/jobs')
+jobs.register_error_handler(ApiError, handle_api_error)
+
+# Верхняя граница длинного опроса (секунд)
+MAX_WAIT = 30
+
+
+class QueueFull(Exception):
+    """В очереди уже max_pending незавершенных заданий."""
+
+
+class JobTerminated(Exception):
+    """Процесс задания завершен до получения результата."""
+
+
+def _run_in_child(conn, fn, args):
+    try:
+        result = ('ok', fn(*args))
+    except BaseException as exc:
+        result = ('error', exc)
+    try:
+        conn.send(result)
+    except Exception as exc:
+        conn.send(('error', RuntimeError(f'{type(exc).__name__}: {exc}')))
+    conn.close()
+
+
+class ProcessJobExecutor:
+    """
+    Исполнитель, запускающий каждое задание в отдельном процессе, не
+    больше max_workers одновременно. В отличие от ProcessPoolExecutor
+    выполняющееся задание можно прервать (terminate), не затрагивая
+    остальные: воркер, занятый заданием с истекшим таймаутом, не
+    остается занятым навсегда.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._queue = deque()
+        self._processes = {}
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, fn, *args):
+        future = futures.Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('Исполнитель остановлен')
+            self._queue.append((future, fn, args))
+            self._dispatch()
+        return future
+
+    def terminate(self, future):
+        """Прерывает задание future: из очереди - отменой, выполняющееся - завершением процесса."""
+        if future.cancel():
+            return
+        with self._lock:
+            process = self._processes.get(future)
+        if process is not None:
+            process.terminate()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        with self._lock:
+            self._shutdown = True
+            queued = list(self._queue) if cancel_futures else []
+            if cancel_futures:
+                self._queue.clear()
+            running = list(self._processes.values())
+        for future, _, _ in queued:
+            future.cancel()
+        if cancel_futures:
+            for process in running:
+                process.terminate()
+        if wait:
+            for process in running:
+                process.join()
+
+    def _dispatch(self):
+        # Вызывается под self._lock
+        while self._queue and len(self._processes) < self.max_workers:
+            future, fn, args = self._queue.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_run_in_child, args=(sender, fn, args), daemon=True)
+            process.start()
+            sender.close()
+            self._processes[future] = process
+            threading.Thread(target=self._watch, args=(future, process, receiver),
+                             name=f'job-{process.pid}', daemon=True).start()
+
+    def _watch(self, future, process, receiver):
+        try:
+            status, value = receiver.recv()
+        except (EOFError, OSError):
+            status = None
+        finally:
+            receiver.close()
+        process.join()
+        if status is None:
+            status, value = 'error', JobTerminated(f'Процесс задания завершен (код {process.exitcode})')
+        with self._lock:
+            del self._processes[future]
+            self._dispatch()
+        if status == 'ok':
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+
+EXECUTORS = {
+    'process': ProcessJobExecutor,
+    'thread': futures.ThreadPoolExecutor,
+}
+
+
+class Job:
+    """Задание очереди: future исполнителя и сроки жизни."""
+
+    def __init__(self, future, timeout):
+        self.id = uuid.uuid4().hex
+        self.future = future
+        self.created = time.monotonic()
+        self.deadline = self.created + timeout
+        self.finished = None
+        self.timed_out = False
+        future.add_done_callback(self._mark_finished)
+
+    def _mark_finished(self, future):
+        if self.finished is None:
+            self.finished = time.monotonic()
+
+    @property
+    def status(self):
+        if self.timed_out:
+            return 'timeout'
+        if self.future.cancelled():
+            return 'cancelled'
+        if self.future.done():
+            return 'failed' if self.future.exception() else 'done'
+        if self.future.running():
+            return 'running'
+        return 'queued'
+
+
+class JobQueue:
+    """
+    Ограниченная очередь заданий поверх concurrent.futures.Executor.
+
+    max_pending - сколько заданий может одновременно ожидать или
+                  выполняться; при превышении submit бросает QueueFull;
+    timeout     - сколько секунд с момента постановки дается заданию;
+    result_ttl  - сколько секунд хранится завершенное задание.
+    """
+
+    def __init__(self, executor, max_pending, timeout, result_ttl):
+        self.executor = executor
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            self._reap()
+            if self.pending() >= self.max_pending:
+                raise QueueFull()
+            job = Job(self.executor.submit(fn, *args), self.timeout)
+            self._jobs[job.id] = job
+        # Сторож прерывает задание в срок, даже если его никто не опрашивает
+        watchdog = threading.Timer(self.timeout, self._expire_at_deadline, (job,))
+        watchdog.daemon = True
+        job.future.add_done_callback(lambda future: watchdog.cancel())
+        watchdog.start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._reap()
+            return self._jobs.get(job_id)
+
+    def wait(self, job, timeout):
+        """Ждет завершения задания не дольше timeout и его собственного срока."""
+        remaining = min(timeout, job.deadline - time.monotonic())
+        if remaining > 0:
+            futures.wait([job.future], timeout=remaining)
+        with self._lock:
+            self._expire(job, time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            return {'pending': self.pending(), 'jobs': len(self._jobs)}
+
+    def pending(self):
+        # Задания с истекшим таймаутом, которые нельзя прервать (пул
+        # потоков), продолжают занимать воркер, поэтому тоже учитываются,
+        # пока не завершатся
+        return sum(1 for job in self._jobs.values() if not job.future.done())
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _expire_at_deadline(self, job):
+        with self._lock:
+            self._expire(job, time.monotonic())
+
+    def _expire(self, job, now):
+        if not job.future.done() and not job.timed_out and now >= job.deadline:
+            job.timed_out = True
+            job.finished = now
+            if hasattr(self.executor, 'terminate'):
+                self.executor.terminate(job.future)
+            else:
+                job.future.cancel()
+
+    def _reap(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            self._expire(job, now)
+            if job.finished is not None and now - job.finished > self.result_ttl:
+                del self._jobs[job_id]
+
+
+def get_job_queue():
+    """Очередь текущего приложения; пул создается при первом задании."""
+    queue = current_app.extensions.get('job_queue')
+    if queue is None:
+        config = current_app.config
+        executor = EXECUTORS[config['JOB_EXECUTOR']](max_workers=config['JOB_WORKERS'])
+        queue = JobQueue(executor, config['JOB_QUEUE_DEPTH'],
+                         config['JOB_TIMEOUT'], config['JOB_RESULT_TTL'])
+        current_app.extensions['job_queue'] = queue
+    return queue
+
+
+def shift_job(data, shift_pixels, max_pixels, png_params):
+    """
+    Выполняется в воркере пула: декодирование, сдвиг, гистограмма и PNG
+    (png_params - параметры кодировщика, см. imaging.encoder_params).
+    Возвращает байты PNG и статистику результата.
+    """
+    image_array = image_to_array(open_image(io.BytesIO(data), max_pixels))
+    result_array = get_operation('ring_shift')(image_array, shift_pixels)
+
+    buffered = io.BytesIO()
+    Image.fromarray(result_array).save(buffered, format='PNG', **png_params)
+
+    h, w = result_array.shape[:2]
+    stats = {
+        'width': w,
+        'height': h,
+        'shift_pixels': shift_pixels,
+        'histogram': histogram_to_dict(compute_histogram(result_array)),
+    }
+    return buffered.getvalue(), stats
+
+
+def job_info(job):
+    info = {
+        'id': job.id,
+        'status': job.status,
+        'status_url': url_for('jobs.status', job_id=job.id),
+    }
+    if job.status == 'done':
+        info['result_url'] = url_for('jobs.result', job_id=job.id)
+        info['stats'] = job.future.result()[1]
+    elif job.status == 'failed':
+        info['error'] = str(job.future.exception())
+    return info
+
+
+def find_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise ApiError('Задание не найдено или его результат уже удален', 404)
+    return job
+
+
+@jobs.route('', methods=['POST'])
+def submit():
+    data = read_upload_bytes()
+    shift_pixels = parse_shift_pixels(request.args.get('shift', request.form.get('shift')))
+
+    # Заголовок проверяется сразу: слишком большие изображения не попадают в очередь
+    open_upload(io.BytesIO(data))
+
+    try:
+        config = current_app.config
+        png_params = encoder_params(OUTPUT_ENCODINGS['png'], config['PNG_COMPRESS_LEVEL'], config['PNG_STRATEGY'])
+        job = get_job_queue().submit(shift_job, data, shift_pixels, config['MAX_IMAGE_PIXELS'], png_params)
+    except QueueFull:
+        response = jsonify({'error': 'Очередь заданий заполнена, повторите позже'})
+        response.headers['Retry-After'] = '1'
+        return response, 429
+
+    response = jsonify(job_info(job))
+    response.headers['Location'] = url_for('jobs.status', job_id=job.id)
+    return response, 202
+
+
+@jobs.route('/<job_id>')
+def status(job_id):
+    job = find_job(job_id)
+    try:
+        wait = min(float(request.args.get('wait', 0)), MAX_WAIT)
+    except ValueError:
+        raise ApiError('Параметр wait должен быть числом')
+    if wait > 0:
+        get_job_queue().wait(job, wait)
+    return jsonify(job_info(job))
+
+
+@jobs.route('/<job_id>/result')
+def result(job_id):
+    job = find_job(job_id)
+    if job.status != 'done':
+        return jsonify(job_info(job)), 409
+    return Response(job.future.result()[0], mimetype='image/png')
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Генератор нагрузки для сервиса сдвига.
+
+По умолчанию поднимает приложение из wsgi.py на локальном
+многопоточном WSGI-сервере werkzeug (случайный порт) и отправляет
+--requests запросов с --concurrency параллельными клиентами; с --url
+нагружает уже запущенный сервер (например, gunicorn). Печатает
+пропускную способность и задержки p50/p95/p99, --json сохраняет отчет.
+
+Чтобы измерять обработку, а не кэш результатов, сдвиг меняется от
+запроса к запросу (--repeat-shift отключает это).
+
+Пример:
+    python load_test.py --concurrency 8 --requests 200 --size 640x480
+    python load_test.py --url http://127.0.0.1:8000 --endpoint process
+"""
+
+import argparse
+import io
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+
+ENDPOINTS = ('api', 'process')
+
+
+def synthetic_png(w, h):
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+    buffered = io.BytesIO()
+    Image.fromarray(image).save(buffered, format='PNG', compress_level=1)
+    return buffered.getvalue()
+
+
+def start_local_server():
+    """Запускает wsgi.app в фоновом потоке; возвращает (адрес, сервер)."""
+    from werkzeug.serving import make_server
+
+    from wsgi import app
+
+    # Журнал каждого запроса werkzeug заметно замедляет сервер под нагрузкой
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server
+
+
+class LoadClient:
+    """Отправка одного запроса выбранного типа; сессия своя у каждого потока."""
+
+    def __init__(self, base_url, endpoint, image_data, timeout):
+        self.base_url = base_url
+        self.endpoint = endpoint
+        self.image_data = image_data
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def send(self, shift_pixels):
+        """Возвращает (задержка в секундах, HTTP-статус или None при сбое)."""
+        start = time.perf_counter()
+        try:
+            if self.endpoint == 'api':
+                response = self.session().post(f'{self.base_url}/api/v1/shift',
+                                               params={'shift': shift_pixels, 'format': 'png'},
+                                               data=self.image_data, timeout=self.timeout,
+                                               headers={'Content-Type': 'application/octet-stream'})
+            else:
+                response = self.session().post(f'{self.base_url}/process',
+                                               files={'image': ('load.png', self.image_data, 'image/png')},
+                                               data={'shift_pixels': shift_pixels}, timeout=self.timeout)
+            response.content
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        return time.perf_counter() - start, status
+
+
+def run_load(client, total, concurrency, repeat_shift):
+    shifts = [10 if repeat_shift else 1 + i % 1000 for i in range(total)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client.send, shifts))
+    return results, time.perf_counter() - start
+
+
+def summarize(results, wall_time):
+    latencies = np.array([latency for latency, status in results if status == 200])
+    errors = sum(1 for _, status in results if status != 200)
+    report = {
+        'requests': len(results),
+        'errors': errors,
+        'wall_time': wall_time,
+        'throughput': len(latencies) / wall_time if wall_time else 0.0,
+    }
+    if latencies.size:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        report.update(p50=p50, p95=p95, p99=p99, mean=latencies.mean(), max=latencies.max())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='адрес запущенного сервера (по умолчанию - локальный wsgi.py)')
+    parser.add_argument('--endpoint', choices=ENDPOINTS, default='api')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5, help='запросов до начала измерений')
+    parser.add_argument('--size', default='640x480', help='размер синтетического изображения')
+    parser.add_argument('--image', help='файл изображения вместо синтетического')
+    parser.add_argument('--repeat-shift', action='store_true',
+                        help='одинаковый сдвиг во всех запросах (проверка кэша)')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--json', help='сохранить отчет в JSON')
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image_data = f.read()
+    else:
+        w, h = (int(v) for v in args.size.lower().split('x'))
+        image_data = synthetic_png(w, h)
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        base_url, server = start_local_server()
+
+    client = LoadClient(base_url.rstrip('/'), args.endpoint, image_data, args.timeout)
+    try:
+        run_load(client, args.warmup, args.concurrency, repeat_shift=True)
+        results, wall_time = run_load(client, args.requests, args.concurrency, args.repeat_shift)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report = summarize(results, wall_time)
+    report.update(endpoint=args.endpoint, concurrency=args.concurrency, url=base_url,
+                  image_bytes=len(image_data))
+
+    print(f"{args.endpoint} @ {base_url}: {report['requests']} запросов, "
+          f"параллельно {args.concurrency}, ошибок {report['errors']}")
+    print(f"Пропускная способность: {report['throughput']:.1f} запр/с за {wall_time:.2f} с")
+    if 'p50' in report:
+        print("Задержка, мс: " + ', '.join(f"{name} {report[name] * 1000:.1f}"
+                                          for name in ('p50', 'p95', 'p99', 'mean', 'max')))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    main()
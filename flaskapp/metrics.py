@@ -0,0 +1,203 @@
+"""
+Измерение времени этапов обработки и экспорт метрик.
+
+Обработчики оборачивают этапы в timed('decode') и т.п.; длительности
+копятся в контексте запроса, а по его завершении попадают в гистограммы
+с метками endpoint, этапа, класса размера изображения и диапазона
+сдвига (set_labels), и в заголовок ответа Server-Timing.
+
+GET /metrics - гистограммы и состояние кэшей в текстовом формате
+Prometheus. Метрики свои у каждого процесса сервера.
+
+Профилирование cProfile включается для всех запросов флагом
+PROFILE_REQUESTS или для отдельного запроса заголовком X-Profile: 1,
+если разрешено PROFILE_ALLOW_HEADER. Дамп (.prof) пишется в PROFILE_DIR,
+его имя возвращается в заголовке X-Profile-Dump.
+"""
+
+import cProfile
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import Blueprint, Response, current_app, g, has_request_context, request
+
+from result_cache import result_cache
+from ring_shift import plan_cache
+
+metrics = Blueprint('metrics', __name__)
+
+# Границы корзин гистограмм длительности (секунд)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Классы размера изображения (мегапиксели) и диапазоны сдвига для меток
+SIZE_CLASSES = ((1, '<1MP'), (4, '1-4MP'), (16, '4-16MP'))
+SHIFT_CLASSES = ((10, '1-10'), (100, '11-100'))
+
+
+class Histogram:
+    """Гистограмма Prometheus: накопленные счетчики корзин по наборам меток."""
+
+    def __init__(self, name, help, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, count, total) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{format_labels(key, le=bound)} {bucket_count}')
+                lines.append(f'{self.name}_bucket{format_labels(key, le="+Inf")} {count}')
+                lines.append(f'{self.name}_sum{format_labels(key)} {total:.6f}')
+                lines.append(f'{self.name}_count{format_labels(key)} {count}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def format_labels(key, **extra):
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+stage_seconds = Histogram('flaskapp_stage_seconds', 'Длительность этапа обработки запроса')
+request_seconds = Histogram('flaskapp_request_seconds', 'Длительность обработки запроса')
+
+
+def size_class(width, height):
+    megapixels = width * height / 1_000_000
+    for bound, name in SIZE_CLASSES:
+        if megapixels < bound:
+            return name
+    return '>=16MP'
+
+
+def shift_class(shift_pixels):
+    for bound, name in SHIFT_CLASSES:
+        if shift_pixels <= bound:
+            return name
+    return '>100'
+
+
+def set_labels(width=None, height=None, shift_pixels=None):
+    """Метки размера и сдвига для этапов текущего запроса."""
+    if not has_request_context():
+        return
+    if width is not None:
+        g.metric_labels['size'] = size_class(width, height)
+    if shift_pixels is not None:
+        g.metric_labels['shift'] = shift_class(shift_pixels)
+
+
+def record(stage, seconds):
+    """Добавляет длительность этапа к текущему запросу (вне запроса - ничего)."""
+    if has_request_context() and 'stage_timings' in g:
+        g.stage_timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+@metrics.before_app_request
+def start_request():
+    g.request_start = time.perf_counter()
+    g.stage_timings = []
+    g.metric_labels = {}
+
+    config = current_app.config
+    if config['PROFILE_REQUESTS'] or (config['PROFILE_ALLOW_HEADER']
+                                      and request.headers.get('X-Profile') == '1'):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+@metrics.after_app_request
+def finish_request(response):
+    if 'request_start' not in g:
+        return response
+    total = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or 'unknown'
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        directory = current_app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        name = f'{endpoint}-{uuid.uuid4().hex[:12]}.prof'
+        profiler.dump_stats(os.path.join(directory, name))
+        response.headers['X-Profile-Dump'] = name
+
+    timings = []
+    for stage, seconds in g.stage_timings:
+        stage_seconds.observe(seconds, endpoint=endpoint, stage=stage, **g.metric_labels)
+        timings.append(f'{stage};dur={seconds * 1000:.1f}')
+    request_seconds.observe(total, endpoint=endpoint, status=response.status_code)
+    timings.append(f'total;dur={total * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+
+@metrics.teardown_app_request
+def stop_profiler(exc):
+    # Запрос завершился необработанным исключением, минуя after_request
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+
+def cache_lines(prefix, stats):
+    """Счетчики и текущие размеры кэша в формате Prometheus."""
+    lines = []
+    for name, value in stats.items():
+        kind = 'counter' if name in ('hits', 'disk_hits', 'misses', 'evictions', 'rejected') else 'gauge'
+        metric = f'{prefix}_{name}_total' if kind == 'counter' else f'{prefix}_{name}'
+        lines += [f'# TYPE {metric} {kind}', f'{metric} {value}']
+    return lines
+
+
+@metrics.route('/metrics')
+def export():
+    lines = stage_seconds.render() + request_seconds.render()
+    lines += cache_lines('flaskapp_plan_cache', plan_cache.stats())
+    lines += cache_lines('flaskapp_result_cache', result_cache.stats())
+
+    queue = current_app.extensions.get('job_queue')
+    if queue is not None:
+        for name, value in queue.stats().items():
+            lines += [f'# TYPE flaskapp_jobs_{name} gauge', f'flaskapp_jobs_{name} {value}']
+    store = current_app.extensions.get('sessions')
+    if store is not None:
+        lines += cache_lines('flaskapp_sessions', store.stats())
+    adapter = current_app.extensions.get('async_adapter')
+    if adapter is not None:
+        lines += cache_lines('flaskapp_async', adapter.stats())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,73 @@
+"""
+Реестр операций над изображением.
+
+Каждая операция объявляет, какие статистики изображения она сохраняет.
+Например, перестановка пикселей не меняет гистограмму, поэтому
+гистограмму результата можно не пересчитывать, а взять у оригинала.
+"""
+
+from ring_shift import apply_ring_shift, apply_ring_transform, shift_image_rectangular
+
+# Допустимый диапазон и значение сдвига по умолчанию
+MIN_SHIFT = 1
+MAX_SHIFT = 1000
+DEFAULT_SHIFT = 10
+
+# Имена статистик, которые может сохранять операция
+HISTOGRAM = 'histogram'
+
+
+class Operation:
+    """Операция над массивом пикселей и набор сохраняемых ею статистик."""
+
+    def __init__(self, name, func, preserved_stats=()):
+        self.name = name
+        self.func = func
+        self.preserved_stats = frozenset(preserved_stats)
+
+    def __call__(self, image_array, *args, **kwargs):
+        return self.func(image_array, *args, **kwargs)
+
+    def preserves(self, stat):
+        return stat in self.preserved_stats
+
+
+OPERATIONS = {}
+
+
+def register_operation(name, preserves=()):
+    """
+    Декоратор регистрации операции:
+
+        @register_operation('flip', preserves={HISTOGRAM})
+        def flip(image_array): ...
+    """
+    def decorator(func):
+        OPERATIONS[name] = Operation(name, func, preserves)
+        return func
+    return decorator
+
+
+def get_operation(name):
+    return OPERATIONS[name]
+
+
+def parse_shift_pixels(value):
+    """
+    Значение сдвига из параметра запроса: ограничивается диапазоном
+    [MIN_SHIFT, MAX_SHIFT], некорректное значение заменяется значением
+    по умолчанию.
+    """
+    try:
+        shift_pixels = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_SHIFT
+    return min(max(shift_pixels, MIN_SHIFT), MAX_SHIFT)
+
+
+# Сдвиг по контурам только переставляет пиксели
+register_operation('ring_shift', preserves={HISTOGRAM})(apply_ring_shift)
+register_operation('ring_transform', preserves={HISTOGRAM})(apply_ring_transform)
+
+# Прежний вариант усредняет grayscale во float, распределение может измениться
+register_operation('ring_shift_legacy')(shift_image_rectangular)
@@ -0,0 +1,129 @@
+"""
+Обработка очень больших изображений вне оперативной памяти.
+
+Декодированные пиксели записываются в np.memmap во временном файле,
+сдвиг по контурам выполняется на месте группами по band слоев (в памяти
+только четыре полосы текущей группы), а результат кодируется в PNG
+потоком прямо из отображенного файла (imaging.iter_png). После каждого
+этапа страницы отображения сбрасываются на диск и возвращаются ядру,
+поэтому пиковый RSS не растет вместе с размером изображения.
+
+Полностью в памяти остается только декодирование Pillow: оно держит
+одну копию изображения, которая освобождается сразу после переноса
+пикселей в файл.
+"""
+
+import mmap
+import tempfile
+
+import numpy as np
+
+from imaging import image_to_array, iter_png
+from ring_shift import pixel_view, ring_positions, ring_sources
+
+# Число контуров, сдвигаемых за один проход по файлу
+DEFAULT_BAND = 64
+
+
+def scratch_array(shape, dtype, directory=None):
+    """
+    Массив np.memmap во временном файле. Файл сразу удаляется из
+    каталога и освобождается вместе с последним отображением.
+    """
+    with tempfile.TemporaryFile(dir=directory) as f:
+        return np.memmap(f, dtype=dtype, mode='w+', shape=shape)
+
+
+def release_pages(array):
+    """
+    Записывает изменения отображенного массива на диск и возвращает его
+    страницы ядру: данные остаются в файле, но перестают занимать RSS.
+    """
+    mapping = getattr(array, '_mmap', None)
+    if mapping is None:
+        return
+    array.flush()
+    if hasattr(mmap, 'MADV_DONTNEED'):
+        mapping.madvise(mmap.MADV_DONTNEED)
+
+
+def ring_shift_inplace(image, shift_pixels, band=DEFAULT_BAND):
+    """
+    Сдвиг по контурам на месте с ограниченной рабочей памятью.
+
+    Контуры [k0, k1) целиком лежат в четырех непересекающихся полосах:
+    строки [k0, k1) и [h-k1, h-k0), а между ними столбцы [k0, k1) и
+    [w-k1, w-k0). Полосы копируются в буфер, контуры сдвигаются в нем
+    и записываются обратно - около band * 2 * (h + w) пикселей за проход.
+    Результат совпадает с ring_shift.apply_ring_shift; shift_pixels может
+    быть и массивом сдвигов по контурам (см. ring_shift.ring_shifts).
+    """
+    h, w = image.shape[:2]
+    pixels = image.reshape(h, w, -1)
+    channels = pixels.shape[2]
+    layers = max(min(h, w) // 2, 1)
+
+    for k0 in range(0, layers, band):
+        k1 = min(k0 + band, layers)
+        rings = [ring for ring in (ring_positions(h, w, layer) for layer in range(k0, k1))
+                 if ring is not None]
+        if not rings:
+            continue
+
+        regions = [(slice(k0, k1), slice(0, w)),
+                   (slice(h - k1, h - k0), slice(0, w)),
+                   (slice(k1, h - k1), slice(k0, k1)),
+                   (slice(k1, h - k1), slice(w - k1, w - k0))]
+        sizes = [(r.stop - r.start) * (c.stop - c.start) for r, c in regions]
+        offsets = np.cumsum([0] + sizes)
+        buffer = np.empty((offsets[-1], channels), dtype=pixels.dtype)
+        for (rows, cols), begin, end in zip(regions, offsets, offsets[1:]):
+            buffer[begin:end] = pixels[rows, cols].reshape(end - begin, channels)
+
+        # Положение каждого пикселя контуров внутри буфера
+        positions = np.concatenate(rings)
+        y, x = np.divmod(positions, w)
+        band_width = k1 - k0
+        index = np.select(
+            [y < k1, y >= h - k1, x < k1],
+            [(y - k0) * w + x,
+             offsets[1] + (y - (h - k1)) * w + x,
+             offsets[2] + (y - k1) * band_width + (x - k0)],
+            offsets[3] + (y - k1) * band_width + (x - (w - k1)))
+
+        lengths = np.array([ring.size for ring in rings], dtype=np.intp)
+        starts = np.cumsum(lengths) - lengths
+        # Массив сдвигов по контурам (ring_shifts) - срез для этой группы
+        shifts = shift_pixels[k0:k0 + len(rings)] if np.ndim(shift_pixels) else shift_pixels
+        packed = pixel_view(buffer)
+        target = buffer if packed is None else packed
+        values = target[index]
+        target[index] = values[ring_sources(starts, lengths, shifts)]
+
+        for (rows, cols), begin, end in zip(regions, offsets, offsets[1:]):
+            pixels[rows, cols] = buffer[begin:end].reshape(rows.stop - rows.start,
+                                                           cols.stop - cols.start, channels)
+        release_pages(image)
+    return image
+
+
+def shift_to_scratch(img, shift_pixels, directory=None, band=DEFAULT_BAND):
+    """
+    Декодирует открытое изображение в np.memmap во временном файле
+    каталога directory и сдвигает его на месте. Возвращает отображенный
+    массив результата (форма и тип данных - как у image_to_array).
+    """
+    image = image_to_array(img, allocate=lambda shape, dtype: scratch_array(shape, dtype, directory))
+    img.close()
+    release_pages(image)
+    return ring_shift_inplace(image, shift_pixels, band)
+
+
+def iter_scratch_png(image, compress_level=6, strategy='default'):
+    """
+    Потоковый PNG из отображенного массива: прочитанные кодировщиком
+    полосы сразу возвращаются ядру.
+    """
+    for data in iter_png(image, compress_level, strategy):
+        release_pages(image)
+        yield data
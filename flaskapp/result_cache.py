@@ -0,0 +1,232 @@
+"""
+Кэш готовых результатов, адресуемый по содержимому.
+
+Ключ - хэш BLAKE2b загруженных байтов вместе с параметрами обработки
+(сдвиг, формат вывода и т.п.), значение - закодированные изображения и
+данные гистограмм. Кэш двухуровневый: LRU в памяти процесса и
+необязательный каталог на диске, общий для всех воркеров gunicorn.
+Ключ одновременно служит ETag ответа.
+"""
+
+import hashlib
+import itertools
+import os
+import pickle
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Бюджеты памяти и диска по умолчанию
+DEFAULT_MEMORY_BYTES = 128 * 1024 * 1024
+DEFAULT_DISK_BYTES = 1024 * 1024 * 1024
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_key(stream, *options):
+    """
+    Ключ кэша: хэш содержимого потока и параметров. Поток читается
+    порциями и перематывается в начало для последующего декодирования.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    digest.update(repr(options).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def derived_key(base_key, *options):
+    """Ключ результата, производного от уже хэшированного содержимого."""
+    digest = hashlib.blake2b(base_key.encode('ascii'), digest_size=16)
+    digest.update(repr(options).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def is_key(text):
+    """Является ли строка ключом кэша (hex BLAKE2b из content_key/derived_key)."""
+    return len(text) == 32 and all(c in '0123456789abcdef' for c in text)
+
+
+class ResultCache:
+    """
+    LRU-кэш результатов с ограничением по размеру.
+
+    max_bytes      - бюджет кэша в памяти (0 - не кэшировать в памяти);
+    directory      - каталог дискового уровня (None - только память);
+    disk_max_bytes - бюджет дискового уровня.
+    Размер записи считается по ее сериализованному представлению.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BYTES, directory=None, disk_max_bytes=DEFAULT_DISK_BYTES):
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.configure(max_bytes, directory, disk_max_bytes)
+
+    def configure(self, max_bytes, directory=None, disk_max_bytes=DEFAULT_DISK_BYTES):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self.directory = directory
+            self.disk_max_bytes = disk_max_bytes
+            # Оценка занятого на диске места (None - каталог еще не сканировался)
+            self._disk_bytes = None
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._evict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, value[0], value[1])
+        return value[0]
+
+    def contains(self, key):
+        """Есть ли запись в памяти или на диске (без учета в статистике)."""
+        with self._lock:
+            if key in self._entries:
+                return True
+        return bool(self.directory) and os.path.exists(self._path(key))
+
+    def put(self, key, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, value, len(data))
+        self._write_disk(key, [data], len(data))
+
+    def put_stream(self, key, stream):
+        """
+        Сохраняет байты потока с начала (например, загруженного файла).
+        Значение больше бюджета памяти копируется порциями прямо в
+        дисковый уровень и целиком в память не читается.
+        """
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        if size <= self.max_bytes:
+            chunks = list(iter(lambda: stream.read(HASH_CHUNK_SIZE), b''))
+            stream.seek(0)
+            self.put(key, b''.join(chunks))
+            return
+
+        # Запись на диске - pickle объекта bytes: заголовок с длиной, байты
+        # и конец; такую запись читает обычный _read_disk
+        header = pickle.PROTO + bytes([4]) + pickle.BINBYTES8 + struct.pack('<Q', size)
+        chunks = iter(lambda: stream.read(HASH_CHUNK_SIZE), b'')
+        self._write_disk(key, itertools.chain([header], chunks, [pickle.STOP]), len(header) + size + 1)
+        stream.seek(0)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _remember(self, key, value, size):
+        with self._lock:
+            if key in self._entries or size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._entries and self._bytes > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Время доступа для LRU-вытеснения на диске
+            os.utime(path)
+            return pickle.loads(data), len(data)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _write_disk(self, key, chunks, size):
+        directory = self.directory
+        if not directory or size > self.disk_max_bytes:
+            return
+        try:
+            # Запись во временный файл и атомарная замена: другие воркеры
+            # никогда не увидят частично записанную запись
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            path = self._path(key)
+            try:
+                replaced = os.stat(path).st_size
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        # Каталог сканируется только при первой записи и когда оценка
+        # занятого места превысила бюджет (записи других воркеров
+        # учитываются при таком пересчете)
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size - replaced
+            rescan = self._disk_bytes is None or self._disk_bytes > self.disk_max_bytes
+        if rescan:
+            self._evict_disk(directory)
+
+    def _evict_disk(self, directory):
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith('.pickle'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+
+# Общий кэш результатов процесса
+result_cache = ResultCache()
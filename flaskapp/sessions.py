@@ -0,0 +1,312 @@
+"""
+Сеансы интерактивной подстройки сдвига.
+
+Сдвиги по контурам складываются по каждому контуру. Поэтому
+изображение загружается и декодируется один раз, а следующий результат
+получается из предыдущего сдвигом на приращение. План для небольшого
+приращения общий для всех сеансов того же размера и почти всегда уже
+лежит в кэше планов, а новый план под каждое накопленное значение не
+строится.
+
+POST   /api/v1/sessions                 - загрузка изображения (как в
+         /api/v1/shift, с ?shift=N и ?max_size=N); ответ 201 с описанием
+         сеанса и заголовком Location;
+POST   /api/v1/sessions/<id>/shift      - ?delta=N сдвигает текущий
+         результат еще на N (допускаются отрицательные значения и те же
+         mode/shifts/direction/inverse, что у /api/v1/shift) или ?shift=N
+         задает полный сдвиг; в ответе только новое изображение;
+GET    /api/v1/sessions/<id>/result     - текущий результат;
+GET    /api/v1/sessions/<id>            - описание сеанса;
+DELETE /api/v1/sessions/<id>            - удаление.
+
+Формат изображения задается так же, как в /api/v1/shift (?format= или
+Accept, кроме json). Сеанс удаляется через SESSION_TTL секунд без
+обращений, а при превышении бюджета SESSION_MAX_BYTES вытесняются
+давно не использованные сеансы. Сеансы хранятся в памяти процесса,
+поэтому обращаться к сеансу нужно к тому же воркеру (как и к /jobs).
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from flask import Blueprint, Response, current_app, jsonify, request, url_for
+from PIL import Image, features
+
+from api import (ApiError, cached_response, handle_api_error, int_arg, iter_and_cache, negotiate_format,
+                 open_upload, parse_transform, read_image, resolve_shifts, size_arg, upload_stream)
+from imaging import array_mode, choose_encoding, encoder_params, iter_encoded, iter_raw, make_preview
+from metrics import set_labels, timed
+from operations import parse_shift_pixels
+from result_cache import content_key, derived_key, result_cache
+from ring_shift import apply_permutation, plan_cache, ring_lengths, ring_shifts, shift_period
+
+sessions = Blueprint('sessions', __name__, url_prefix='/api/v1/sessions')
+sessions.register_error_handler(ApiError, handle_api_error)
+
+
+def reduce_shift(h, w, shift_pixels):
+    """
+    Сдвиг размера h x w, приведенный по модулю периода в симметричный
+    диапазон около нуля: небольшие значения (в том числе отрицательные)
+    не меняются, а сколь угодно большие не доходят до NumPy.
+    """
+    period = shift_period(h, w)
+    shift_pixels %= period
+    return shift_pixels - period if shift_pixels > period // 2 else shift_pixels
+
+
+def compose_shifts(h, w, total, delta):
+    """
+    Сумма двух сдвигов размера h x w. Два числа складываются со знаком и
+    приводятся reduce_shift (период может быть числом в сотни цифр),
+    иначе сдвиги складываются по контурам (см. ring_shifts).
+    """
+    if not np.ndim(total) and not np.ndim(delta):
+        return reduce_shift(h, w, total + delta)
+    per_ring = [shifts if np.ndim(shifts) else ring_shifts(h, w, shifts) for shifts in (total, delta)]
+    return (per_ring[0] + per_ring[1]) % np.maximum(np.array(ring_lengths(h, w), dtype=np.intp), 1)
+
+
+def negate_shifts(shifts):
+    return -shifts if not np.ndim(shifts) else -np.asarray(shifts)
+
+
+class Session:
+    """Сеанс: текущий результат, накопленный сдвиг и время последнего обращения."""
+
+    def __init__(self, source_key, image_array, input_format):
+        self.id = uuid.uuid4().hex
+        self.source_key = source_key
+        self.input_format = input_format
+        self.result = image_array
+        self.total = 0
+        self.created = self.accessed = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return self.result.nbytes
+
+    def shift(self, delta):
+        """Сдвигает текущий результат на delta (число или массив по контурам)."""
+        h, w = self.result.shape[:2]
+        self.result = apply_permutation(self.result, plan_cache.get(h, w, delta))
+        self.total = compose_shifts(h, w, self.total, delta)
+
+    def total_repr(self):
+        return int(self.total) if not np.ndim(self.total) else [int(s) for s in self.total]
+
+    def total_key(self):
+        """Накопленный сдвиг, приведенный по периоду: одинаковый для равных результатов."""
+        if np.ndim(self.total):
+            return self.total_repr()
+        h, w = self.result.shape[:2]
+        return self.total % shift_period(h, w)
+
+
+class SessionStore:
+    """
+    Сеансы процесса с вытеснением по времени и по памяти.
+
+    ttl       - сколько секунд хранится сеанс без обращений;
+    max_bytes - бюджет памяти на результаты всех сеансов.
+    """
+
+    def __init__(self, ttl, max_bytes):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def add(self, session):
+        if session.nbytes > self.max_bytes:
+            raise ApiError('Изображение не помещается в бюджет сеансов', 413)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._reap()
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            self._reap()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.accessed = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def remove(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self):
+        with self._lock:
+            return {'sessions': len(self._sessions), 'bytes': self._bytes(), 'evictions': self.evictions}
+
+    def _bytes(self):
+        return sum(session.nbytes for session in self._sessions.values())
+
+    def _reap(self):
+        now = time.monotonic()
+        for session_id, session in list(self._sessions.items()):
+            if now - session.accessed > self.ttl:
+                del self._sessions[session_id]
+        # Самые давно использованные - в начале словаря
+        while self._sessions and self._bytes() > self.max_bytes:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+
+def get_session_store():
+    store = current_app.extensions.get('sessions')
+    if store is None:
+        config = current_app.config
+        store = SessionStore(config['SESSION_TTL'], config['SESSION_MAX_BYTES'])
+        current_app.extensions['sessions'] = store
+    return store
+
+
+def find_session(session_id):
+    session = get_session_store().get(session_id)
+    if session is None:
+        raise ApiError('Сеанс не найден или истек', 404)
+    return session
+
+
+def session_info(session):
+    h, w = session.result.shape[:2]
+    return {
+        'id': session.id,
+        'width': w,
+        'height': h,
+        'shift': session.total_repr(),
+        'ttl': current_app.config['SESSION_TTL'],
+        'session_url': url_for('sessions.info', session_id=session.id),
+        'shift_url': url_for('sessions.shift', session_id=session.id),
+        'result_url': url_for('sessions.result', session_id=session.id),
+    }
+
+
+def negotiate_image_format():
+    """Формат изображения ответа (до изменения сеанса, чтобы ошибка его не трогала)."""
+    output = negotiate_format()
+    if output == 'json':
+        raise ApiError('Сеанс возвращает изображение; описание - GET /api/v1/sessions/<id>', 406)
+    if output.startswith('webp') and not features.check('webp'):
+        raise ApiError('WebP не поддерживается сервером', 406)
+    return output
+
+
+def result_response(session, output):
+    """Кодирует текущий результат сеанса в формате output."""
+    result_array = session.result
+    headers = {'X-Session-Id': session.id}
+    if not np.ndim(session.total):
+        headers['X-Shift-Pixels'] = str(session.total)
+
+    if output == 'raw':
+        h, w = result_array.shape[:2]
+        headers.update({
+            'X-Image-Width': str(w),
+            'X-Image-Height': str(h),
+            'X-Image-Channels': str(1 if result_array.ndim == 2 else result_array.shape[2]),
+            'X-Image-Dtype': result_array.dtype.str,
+            'Content-Length': str(result_array.nbytes),
+        })
+        return Response(iter_raw(result_array), mimetype='application/octet-stream', headers=headers)
+
+    mode = array_mode(result_array)
+    encoding = choose_encoding(mode, session.input_format, output)
+    if output != 'auto' and encoding.name != output:
+        raise ApiError(f'Формат {output} не поддерживает режим изображения {mode}', 406)
+
+    # Результат зависит только от исходных байтов и накопленного сдвига,
+    # поэтому возврат к уже виденному сдвигу берется из кэша
+    key = derived_key(session.source_key, 'session', session.total_key(), encoding.name)
+    if request.if_none_match.contains(key):
+        response = cached_response(key, None, None, headers, 'hit')
+        response.status_code = 304
+        return response
+    cached = result_cache.get(key)
+    if cached is not None:
+        mimetype, body = cached
+        return cached_response(key, body, mimetype, headers, 'hit')
+
+    config = current_app.config
+    params = encoder_params(encoding, config['PNG_COMPRESS_LEVEL'], config['PNG_STRATEGY'])
+    # Массив результата при следующем сдвиге заменяется, а не изменяется,
+    # поэтому кодирование потоком после снятия блокировки безопасно
+    body = iter_and_cache(key, encoding.mimetype,
+                          iter_encoded(Image.fromarray(result_array), encoding.format, **params))
+    return cached_response(key, body, encoding.mimetype, headers, 'miss')
+
+
+@sessions.route('', methods=['POST'])
+def create():
+    stream = upload_stream()
+    max_size = size_arg('max_size', 0)
+    source_key = content_key(stream, 'session', max_size)
+
+    with timed('open'):
+        img = open_upload(stream, draft_size=max_size)
+        input_format = img.format
+        if max_size:
+            img = make_preview(img, max_size)
+    with timed('decode'):
+        image_array = read_image(img)
+
+    session = Session(source_key, image_array, input_format)
+    if 'shift' in request.args:
+        shift_pixels = parse_shift_pixels(request.args['shift'])
+        set_labels(img.width, img.height, shift_pixels)
+        with timed('shift'):
+            session.shift(shift_pixels)
+    get_session_store().add(session)
+
+    response = jsonify(session_info(session))
+    response.headers['Location'] = url_for('sessions.info', session_id=session.id)
+    return response, 201
+
+
+@sessions.route('/<session_id>/shift', methods=['POST'])
+def shift(session_id):
+    session = find_session(session_id)
+    output = negotiate_image_format()
+    transform = parse_transform()
+
+    with session.lock:
+        h, w = session.result.shape[:2]
+        if 'shift' in request.args:
+            # Полный сдвиг: приращение от накопленного значения
+            target = resolve_shifts(h, w, reduce_shift(h, w, int_arg('shift', 0)), transform)
+            delta = compose_shifts(h, w, target, negate_shifts(session.total))
+        else:
+            delta = resolve_shifts(h, w, reduce_shift(h, w, int_arg('delta', 0)), transform)
+        set_labels(w, h, int(np.max(np.abs(delta), initial=0)))
+        with timed('shift'):
+            session.shift(delta)
+        return result_response(session, output)
+
+
+@sessions.route('/<session_id>/result')
+def result(session_id):
+    session = find_session(session_id)
+    output = negotiate_image_format()
+    with session.lock:
+        return result_response(session, output)
+
+
+@sessions.route('/<session_id>')
+def info(session_id):
+    return jsonify(session_info(find_session(session_id)))
+
+
+@sessions.route('/<session_id>', methods=['DELETE'])
+def delete(session_id):
+    if not get_session_store().remove(session_id):
+        raise ApiError('Сеанс не найден или истек', 404)
+    return '', 204
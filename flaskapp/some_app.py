@@ -1,110 +1,71 @@
 import os
 import numpy as np
-from flask import Flask, render_template, request
-from werkzeug.utils import secure_filename
+from flask import Flask, Request, current_app, make_response, render_template, request, url_for
 from PIL import Image
-import matplotlib.pyplot as plt
 import io
 import base64
+import tempfile
+import time
 
-app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+from api import api
+from batch import batch
+from health import health, start_warmup
+from histogram import compute_histogram, histogram_to_dict, plot_lock, pyplot, render_histogram_png
+from imaging import (OUTPUT_ENCODINGS, ImageTooLarge, choose_encoding, encode_image,
+                     encoder_params, image_to_array, make_preview, open_image, png_supports)
+from jobs import jobs
+from metrics import metrics, record, set_labels, timed
+from operations import HISTOGRAM, get_operation, parse_shift_pixels
+from out_of_core import iter_scratch_png, shift_to_scratch
+from result_cache import content_key, derived_key, is_key, result_cache
+from ring_shift import plan_cache, shift_executor
+from sessions import sessions
 
-# Создаем папку для загрузок
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+class UploadRequest(Request):
+    """
+    Запрос, в котором загружаемые файлы держатся в памяти, пока их размер
+    не превысит UPLOAD_SPOOL_THRESHOLD; более крупные файлы сбрасываются
+    в анонимный временный файл с уникальным именем в UPLOAD_FOLDER.
+    upload_on_disk - попал ли загруженный файл на диск (для журнала).
+    """
+    
+    upload_on_disk = False
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        threshold = current_app.config['UPLOAD_SPOOL_THRESHOLD']
+        folder = current_app.config['UPLOAD_FOLDER']
+        if total_content_length is not None and total_content_length > threshold:
+            self.upload_on_disk = True
+            return tempfile.TemporaryFile('rb+', dir=folder)
+        # Файл не длиннее всего запроса остается в памяти; при неизвестной
+        # длине (chunked) он мог быть сброшен на диск
+        self.upload_on_disk = total_content_length is None
+        return tempfile.SpooledTemporaryFile(max_size=threshold, mode='rb+', dir=folder)
 
 # Разрешенные расширения файлов
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
+HISTOGRAM_RENDERERS = {'pillow', 'json', 'matplotlib'}
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def shift_image_rectangular(image_array, shift_pixels):
-    """
-    Функция сдвига изображения по прямоугольному контуру.
-    Вариант 20: сдвиг по замкнутым прямоугольным составляющим.
-    """
-    h, w = image_array.shape[:2]
-    
-    # Если изображение в градациях серого
-    if len(image_array.shape) == 2:
-        # Конвертируем в RGB для наглядности
-        result = np.stack([image_array] * 3, axis=2)
-        channels = 3
-    else:
-        result = image_array.copy()
-        channels = image_array.shape[2]
-    
-    # Определяем количество прямоугольных слоев (контуров)
-    layers = min(h, w) // 2
-    if layers == 0:
-        layers = 1
-    
-    for layer in range(layers):
-        # Координаты текущего прямоугольного контура
-        top = layer
-        bottom = h - layer - 1
-        left = layer
-        right = w - layer - 1
-        
-        # Если прямоугольник выродился в линию или точку, пропускаем
-        if bottom <= top or right <= left:
-            continue
-        
-        # Вычисляем периметр текущего контура
-        perimeter = []
-        positions = []
-        
-        # Верхняя сторона (слева направо)
-        for x in range(left, right + 1):
-            perimeter.append(result[top, x].copy())
-            positions.append((top, x))
-        
-        # Правая сторона (сверху вниз, без угла)
-        for y in range(top + 1, bottom + 1):
-            perimeter.append(result[y, right].copy())
-            positions.append((y, right))
-        
-        # Нижняя сторона (справа налево, без угла)
-        for x in range(right - 1, left - 1, -1):
-            perimeter.append(result[bottom, x].copy())
-            positions.append((bottom, x))
-        
-        # Левая сторона (снизу вверх, без углов)
-        for y in range(bottom - 1, top, -1):
-            perimeter.append(result[y, left].copy())
-            positions.append((y, left))
-        
-        # Циклический сдвиг пикселей по контуру
-        if len(perimeter) > 0:
-            # Вычисляем реальный сдвиг для этого контура
-            actual_shift = shift_pixels % len(perimeter)
-            if actual_shift > 0:
-                # Выполняем сдвиг
-                shifted_perimeter = perimeter[-actual_shift:] + perimeter[:-actual_shift]
-                
-                # Записываем сдвинутые пиксели обратно
-                for idx, (y, x) in enumerate(positions):
-                    result[y, x] = shifted_perimeter[idx]
-    
-    # Если изначально было grayscale, возвращаем к одному каналу
-    if len(image_array.shape) == 2:
-        # Берем только один канал (например, красный) или конвертируем в grayscale
-        result = np.mean(result, axis=2)
-    
-    return result
+def is_normalized(data):
+    """Данные в диапазоне [0, 1] бывают только у массивов с плавающей точкой."""
+    return np.issubdtype(data.dtype, np.floating) and data.max() <= 1.0
 
 def create_color_plot(image_array, title_prefix=""):
     """
     Создаем график распределения цветов для изображения.
     """
+    plt = pyplot()
+    
     # Определяем тип изображения
     if len(image_array.shape) == 2:  # Grayscale
         fig, axes = plt.subplots(1, 1, figsize=(10, 4))
         
         # Нормализуем значения для гистограммы
-        if image_array.max() <= 1.0:
+        if is_normalized(image_array):
             data = (image_array * 255).flatten()
         else:
             data = image_array.flatten()
@@ -123,7 +84,7 @@ def create_color_plot(image_array, title_prefix=""):
         
         for i in range(4):
             channel = image_array[:, :, i]
-            if channel.max() <= 1.0:
+            if is_normalized(channel):
                 data = (channel * 255).flatten()
             else:
                 data = channel.flatten()
@@ -134,23 +95,24 @@ def create_color_plot(image_array, title_prefix=""):
             axes[i].set_ylabel('Частота')
             axes[i].grid(True, alpha=0.3)
             
-    else:  # RGB или другое
+    else:  # RGB, Grayscale + Alpha или другое
         channels = min(3, image_array.shape[2])
         fig, axes = plt.subplots(channels, 1, figsize=(10, 3 * channels))
         
         if channels == 1:
             axes = [axes]
         
-        colors = ['Red', 'Green', 'Blue']
+        colors = ['Gray', 'Alpha'] if channels == 2 else ['Red', 'Green', 'Blue']
         
         for i in range(channels):
             channel = image_array[:, :, i]
-            if channel.max() <= 1.0:
+            if is_normalized(channel):
                 data = (channel * 255).flatten()
             else:
                 data = channel.flatten()
             
-            axes[i].hist(data, bins=50, color=colors[i].lower(), alpha=0.7, edgecolor='black')
+            color = {'Alpha': 'purple'}.get(colors[i], colors[i].lower())
+            axes[i].hist(data, bins=50, color=color, alpha=0.7, edgecolor='black')
             axes[i].set_title(f'{title_prefix}Канал {colors[i]}')
             axes[i].set_xlabel('Интенсивность')
             axes[i].set_ylabel('Частота')
@@ -167,13 +129,95 @@ def create_color_plot(image_array, title_prefix=""):
     # Конвертируем в base64
     return base64.b64encode(buf.read()).decode('utf-8')
 
-@app.route('/')
+def render_color_plots(original_array, result_array, operation, renderer):
+    """
+    Гистограммы оригинала и результата выбранным способом: base64 PNG
+    для 'pillow' и 'matplotlib', словари счетчиков для 'json'.
+    Если операция сохраняет гистограмму, распределение результата
+    не пересчитывается, а берется у оригинала.
+    """
+    if renderer == 'matplotlib':
+        with plot_lock:
+            return (create_color_plot(original_array, "Оригинал: "),
+                    create_color_plot(result_array, "Результат: "))
+    
+    render = histogram_to_dict if renderer == 'json' else render_histogram_png
+    original_plot = render(compute_histogram(original_array))
+    
+    if operation.preserves(HISTOGRAM):
+        return original_plot, original_plot
+    return original_plot, render(compute_histogram(result_array))
+
+def output_params(encoding):
+    """Параметры кодировщика с настройками сжатия PNG из конфигурации"""
+    return encoder_params(encoding, current_app.config['PNG_COMPRESS_LEVEL'], current_app.config['PNG_STRATEGY'])
+
+def process_image(stream, shift_pixels, renderer, output, preview_size):
+    """
+    Конвейер для страницы результата: декодирование уменьшенной копии
+    (preview_size, 0 - полный размер; JPEG декодируется сразу уменьшенным
+    через draft), ее сдвиг на пропорционально уменьшенное число пикселей,
+    гистограммы и кодирование. Результат в полном разрешении строится
+    только по ссылке (full_result). Возвращает переменные шаблона.
+    """
+    start = time.perf_counter()
+    
+    # Открываем изображение (с проверкой бюджета пикселей) и декодируем
+    # только уменьшенную копию в исходном типе данных
+    with timed('decode'):
+        img = open_image(stream, current_app.config['MAX_IMAGE_PIXELS'])
+        image_size = img.size
+        if preview_size:
+            img.draft(img.mode, (preview_size, preview_size))
+        img_array_original = image_to_array(make_preview(img, preview_size))
+    set_labels(image_size[0], image_size[1], shift_pixels)
+    
+    # Сдвигаем копию (форма и тип данных сохраняются) на сдвиг в ее масштабе
+    preview_shift = round(shift_pixels * img_array_original.shape[1] / image_size[0])
+    operation = get_operation('ring_shift')
+    with timed('shift'):
+        result_array = operation(img_array_original, preview_shift)
+    
+    with timed('preview'):
+        img_display = Image.fromarray(img_array_original)
+        result_display = Image.fromarray(result_array)
+    
+    # Создаем графики распределения цветов
+    with timed('histogram'):
+        original_plot, result_plot = render_color_plots(
+            img_array_original, result_array, operation, renderer)
+    
+    # Кодируем изображения (формат по умолчанию - как у загруженного файла)
+    # и конвертируем в base64 для отображения в HTML
+    encoding = choose_encoding(result_display.mode, img.format, output)
+    params = output_params(encoding)
+    with timed('encode'):
+        original_data = encode_image(img_display, encoding, **params)
+        result_data = encode_image(result_display, encoding, **params)
+    with timed('base64'):
+        original_b64 = base64.b64encode(original_data).decode('utf-8')
+        result_b64 = base64.b64encode(result_data).decode('utf-8')
+    
+    current_app.logger.info("process: %dx%d, обработка %.1f мс",
+                    image_size[0], image_size[1], (time.perf_counter() - start) * 1000)
+    
+    return dict(original_image=original_b64,
+                result_image=result_b64,
+                original_plot=original_plot,
+                result_plot=result_plot,
+                plot_format='json' if renderer == 'json' else 'png',
+                image_mimetype=encoding.mimetype,
+                image_size=image_size,
+                preview_size=img_display.size,
+                shift_pixels=shift_pixels)
+
 def index():
     return render_template('index.html')
 
-@app.route('/process', methods=['POST'])
 def process():
-    # Проверяем файл
+    start = time.perf_counter()
+    
+    # Проверяем файл (здесь же werkzeug разбирает multipart-запрос)
     if 'image' not in request.files:
         return "Файл не выбран", 400
     
@@ -186,88 +230,247 @@ def process():
         return "Недопустимый формат файла (разрешены: png, jpg, jpeg)", 400
     
     # Получаем параметр сдвига
+    shift_pixels = parse_shift_pixels(request.form.get('shift_pixels'))
+    
+    # Способ построения гистограмм (можно переопределить полем формы)
+    renderer = request.form.get('histogram', current_app.config['HISTOGRAM_RENDERER'])
+    if renderer not in HISTOGRAM_RENDERERS:
+        renderer = current_app.config['HISTOGRAM_RENDERER']
+    
+    # Формат вывода изображений (можно переопределить полем формы)
+    output = request.form.get('output', current_app.config['OUTPUT_ENCODING'])
+    if output != 'auto' and output not in OUTPUT_ENCODINGS:
+        output = current_app.config['OUTPUT_ENCODING']
+    
+    # Обрабатываем изображение прямо из потока загрузки, без сохранения на диск
     try:
-        shift_pixels = int(request.form.get('shift_pixels', 10))
-        if shift_pixels < 1:
-            shift_pixels = 1
-        elif shift_pixels > 1000:
-            shift_pixels = 1000
-    except:
-        shift_pixels = 10
-    
-    # Сохраняем оригинальный файл
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
-    
-    # Обрабатываем изображение
-    try:
-        # Открываем изображение
-        img = Image.open(filepath)
+        upload_time = time.perf_counter() - start
+        record('upload', upload_time)
         
-        # Конвертируем в RGB для единообразия
-        if img.mode in ('RGBA', 'LA', 'P'):
-            # Сохраняем альфа-канал если есть
-            if img.mode == 'RGBA':
-                img_rgb = img.convert('RGB')
-                img_array_original = np.array(img_rgb, dtype=np.float32) / 255.0
-                # Для альфа-канала создаем отдельный массив
-                img_alpha = np.array(img)[:, :, 3] / 255.0
-            else:
-                img = img.convert('RGB')
-                img_array_original = np.array(img, dtype=np.float32) / 255.0
-        elif img.mode == 'L':  # Grayscale
-            img_array_original = np.array(img, dtype=np.float32) / 255.0
-            # Конвертируем в 3 канала для обработки
-            img_array_original = np.stack([img_array_original] * 3, axis=2)
-        else:  # RGB
-            img_array_original = np.array(img, dtype=np.float32) / 255.0
+        # Повторная загрузка того же файла с теми же параметрами берется из кэша
+        with timed('hash'):
+            source_key = content_key(file.stream, 'source')
+        preview_size = current_app.config['PREVIEW_MAX_SIZE']
+        key = derived_key(source_key, 'process', shift_pixels, renderer, output, preview_size)
+        if request.if_none_match.contains(key):
+            response = make_response('', 304)
+            response.set_etag(key)
+            return response
         
-        # Применяем сдвиг
-        result_array = shift_image_rectangular(img_array_original, shift_pixels)
+        page = result_cache.get(key)
+        cache_status = 'hit'
+        if page is None:
+            cache_status = 'miss'
+            page = process_image(file.stream, shift_pixels, renderer, output, preview_size)
+            page['full_url'] = url_for('full_result', source_key=source_key,
+                                       shift=shift_pixels, output=output)
+            result_cache.put(key, page)
         
-        # Подготавливаем изображения для отображения
-        # Оригинальное изображение (конвертируем обратно в 0-255)
-        if img_array_original.max() <= 1.0:
-            img_display = Image.fromarray((img_array_original * 255).astype(np.uint8))
-        else:
-            img_display = Image.fromarray(img_array_original.astype(np.uint8))
+        # Исходные байты сохраняются для ленивой выдачи полного разрешения,
+        # только если изображение успешно декодировано
+        if not result_cache.contains(source_key):
+            result_cache.put_stream(source_key, file.stream)
         
-        # Результат обработки
-        if result_array.max() <= 1.0:
-            result_display = Image.fromarray((result_array * 255).astype(np.uint8))
-        else:
-            result_display = Image.fromarray(result_array.astype(np.uint8))
+        with timed('render'):
+            response = make_response(render_template('result.html', **page))
         
-        # Создаем графики распределения цветов
-        original_plot = create_color_plot(img_array_original, "Оригинал: ")
-        result_plot = create_color_plot(result_array, "Результат: ")
+        current_app.logger.info("process: прием загрузки %.1f мс (%s), кэш %s, страница %.1f КБ, всего %.1f мс",
+                        upload_time * 1000,
+                        'на диске' if request.upload_on_disk else 'в памяти',
+                        cache_status, response.content_length / 1024,
+                        (time.perf_counter() - start) * 1000)
         
-        # Конвертируем изображения в base64 для отображения в HTML
-        buffered = io.BytesIO()
-        img_display.save(buffered, format="PNG")
-        original_b64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        response.set_etag(key)
+        response.headers['X-Cache'] = cache_status
+        return response
+    
+    except ImageTooLarge as e:
+        return f"Изображение слишком большое: {str(e)}", 413
+    except Exception as e:
+        return f"Ошибка обработки: {str(e)}", 500
+
+def full_result(source_key):
+    """
+    Результат в полном разрешении. Строится только по запросу пользователя
+    из сохраненных исходных байтов и кэшируется.
+    """
+    if not is_key(source_key):
+        return "Результат не найден", 404
+    
+    shift_pixels = parse_shift_pixels(request.args.get('shift'))
+    output = request.args.get('output', current_app.config['OUTPUT_ENCODING'])
+    if output != 'auto' and output not in OUTPUT_ENCODINGS:
+        output = current_app.config['OUTPUT_ENCODING']
+    
+    key = derived_key(source_key, 'full', shift_pixels, output)
+    if request.if_none_match.contains(key):
+        response = make_response('', 304)
+        response.set_etag(key)
+        return response
+    
+    cached = result_cache.get(key)
+    cache_status = 'hit'
+    if cached is None:
+        cache_status = 'miss'
+        source = result_cache.get(source_key)
+        if source is None:
+            return "Исходное изображение больше не хранится, загрузите его снова", 404
+        
+        try:
+            img = open_image(io.BytesIO(source), current_app.config['MAX_IMAGE_PIXELS'])
+        except ImageTooLarge as e:
+            return f"Изображение слишком большое: {str(e)}", 413
+        input_format = img.format
         
-        buffered = io.BytesIO()
-        result_display.save(buffered, format="PNG")
-        result_b64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        # Очень большие изображения сдвигаются в np.memmap и отдаются
+        # потоковым PNG без кэширования, независимо от запрошенного формата:
+        # другие форматы кодируются только целиком в памяти
+        if img.width * img.height >= current_app.config['OUT_OF_CORE_MIN_PIXELS']:
+            result_array = shift_to_scratch(img, shift_pixels, current_app.config['UPLOAD_FOLDER'])
+            if not png_supports(result_array):
+                return "Режим изображения не записывается потоковым PNG", 415
+            response = current_app.response_class(
+                iter_scratch_png(result_array, current_app.config['PNG_COMPRESS_LEVEL'],
+                                 current_app.config['PNG_STRATEGY']),
+                mimetype=OUTPUT_ENCODINGS['png'].mimetype)
+            response.set_etag(key)
+            response.headers['X-Cache'] = cache_status
+            return response
         
-        # Удаляем временный файл
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        result_array = get_operation('ring_shift')(image_to_array(img), shift_pixels)
         
-        return render_template('result.html',
-                             original_image=original_b64,
-                             result_image=result_b64,
-                             original_plot=original_plot,
-                             result_plot=result_plot,
-                             shift_pixels=shift_pixels)
+        result_image = Image.fromarray(result_array)
+        encoding = choose_encoding(result_image.mode, input_format, output)
+        cached = (encoding.mimetype, encode_image(result_image, encoding, **output_params(encoding)))
+        result_cache.put(key, cached)
     
-    except Exception as e:
-        # Удаляем временный файл в случае ошибки
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        return f"Ошибка обработки: {str(e)}", 500
+    mimetype, body = cached
+    response = make_response(body)
+    response.mimetype = mimetype
+    response.set_etag(key)
+    response.headers['X-Cache'] = cache_status
+    return response
+
+def create_app(config=None):
+    """
+    Фабрика приложения: конфигурация по умолчанию (config переопределяет
+    ее значения), общие кэши, blueprints и маршруты. Тяжелые модули
+    (matplotlib) загружаются лениво, прогрев - см. health.
+    """
+    start = time.perf_counter()
+    app = Flask(__name__)
+    app.request_class = UploadRequest
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+    # Загрузки до этого размера (байт) декодируются прямо из памяти
+    app.config['UPLOAD_SPOOL_THRESHOLD'] = 4 * 1024 * 1024
+    # Бюджет пикселей загружаемого изображения: более крупные изображения
+    # отклоняются с 413 по заголовку, до декодирования
+    app.config['MAX_IMAGE_PIXELS'] = 50_000_000
+    # Изображения от этого числа пикселей декодируются в np.memmap во временном
+    # файле UPLOAD_FOLDER, сдвигаются на месте и кодируются потоком (/api/v1/shift
+    # и полное разрешение /result)
+    app.config['OUT_OF_CORE_MIN_PIXELS'] = 16_000_000
+    # Бюджет памяти кэша перестановок сдвига (байт)
+    app.config['PLAN_CACHE_MAX_BYTES'] = 64 * 1024 * 1024
+    # Число потоков движка сдвига для крупных изображений
+    app.config['SHIFT_WORKERS'] = min(4, os.cpu_count() or 1)
+    
+    # Способ построения гистограмм: 'pillow' (PNG без matplotlib),
+    # 'json' (отрисовка в браузере) или 'matplotlib' (прежние графики)
+    app.config['HISTOGRAM_RENDERER'] = 'pillow'
+    
+    # Формат вывода изображений: 'auto' (как у загруженного файла), 'png',
+    # 'webp' (без потерь), 'webp-lossy' или 'jpeg'; уровень сжатия zlib для PNG
+    # (1 - быстрее всего) и стратегия zlib: default, filtered, huffman, rle, fixed
+    app.config['OUTPUT_ENCODING'] = 'auto'
+    app.config['PNG_COMPRESS_LEVEL'] = 1
+    app.config['PNG_STRATEGY'] = 'default'
+    
+    # Наибольшая сторона изображений на странице результата (px); полное
+    # разрешение отдается отдельной ссылкой. 0 - встраивать полный размер
+    app.config['PREVIEW_MAX_SIZE'] = 800
+    
+    # Анимация сдвига /api/v1/animate: наибольшее число кадров и наибольшая
+    # сторона кадра (px) - все кадры держатся в памяти до кодирования
+    app.config['ANIMATION_MAX_FRAMES'] = 120
+    app.config['ANIMATION_MAX_SIZE'] = 512
+    
+    # Кэш готовых результатов: бюджет в памяти, каталог общего дискового
+    # уровня для всех воркеров (None - отключен, задается и через переменную
+    # окружения RESULT_CACHE_DIR) и его бюджет (байт)
+    app.config['RESULT_CACHE_MAX_BYTES'] = 128 * 1024 * 1024
+    app.config['RESULT_CACHE_DIR'] = os.environ.get('RESULT_CACHE_DIR')
+    app.config['RESULT_CACHE_DISK_MAX_BYTES'] = 1024 * 1024 * 1024
+    
+    # Асинхронные задания (/jobs): исполнитель 'process' или 'thread',
+    # число воркеров, глубина очереди, таймаут задания и срок хранения результата (с)
+    app.config['JOB_EXECUTOR'] = 'process'
+    app.config['JOB_WORKERS'] = 2
+    app.config['JOB_QUEUE_DEPTH'] = 16
+    app.config['JOB_TIMEOUT'] = 120
+    app.config['JOB_RESULT_TTL'] = 300
+    
+    # Сеансы подстройки сдвига (/api/v1/sessions): срок жизни без обращений (с)
+    # и бюджет памяти на декодированные изображения всех сеансов (байт)
+    app.config['SESSION_TTL'] = 600
+    app.config['SESSION_MAX_BYTES'] = 256 * 1024 * 1024
+    
+    # Наибольшее число элементов (файлов x сдвигов) в пакете /api/v1/batch
+    app.config['BATCH_MAX_ITEMS'] = 256
+    
+    # Асинхронный режим (asgi.py под uvicorn, см. async_adapter): потоки для
+    # обработки запросов, наибольшее число одновременно обслуживаемых запросов
+    # и сколько секунд запрос ждет свободного места, прежде чем получить 503
+    app.config['ASYNC_WORKERS'] = int(os.environ.get('ASYNC_WORKERS', min(4, os.cpu_count() or 1)))
+    app.config['ASYNC_MAX_REQUESTS'] = int(os.environ.get('ASYNC_MAX_REQUESTS', 64))
+    app.config['ASYNC_QUEUE_TIMEOUT'] = 10
+    
+    # Профилирование cProfile: для всех запросов или по заголовку X-Profile: 1
+    # (только если разрешено); дампы .prof сохраняются в PROFILE_DIR
+    app.config['PROFILE_REQUESTS'] = False
+    app.config['PROFILE_ALLOW_HEADER'] = False
+    app.config['PROFILE_DIR'] = 'profiles'
+    
+    # Прогрев (см. health): 'background' - в фоновом потоке, 'sync' - до
+    # возврата из фабрики (gunicorn с preload_app, воркеры наследуют прогретый
+    # процесс), 'off' - без прогрева; matplotlib прогревается, только если
+    # выбран этим рендерером гистограмм или WARMUP_MATPLOTLIB
+    app.config['WARMUP'] = os.environ.get('WARMUP', 'background')
+    app.config['WARMUP_MATPLOTLIB'] = False
+    
+    app.config.update(config or {})
+    
+    plan_cache.configure(app.config['PLAN_CACHE_MAX_BYTES'])
+    shift_executor.configure(app.config['SHIFT_WORKERS'])
+    result_cache.configure(app.config['RESULT_CACHE_MAX_BYTES'],
+                           app.config['RESULT_CACHE_DIR'],
+                           app.config['RESULT_CACHE_DISK_MAX_BYTES'])
+    
+    # Машинный API (/api/v1, пакеты - /api/v1/batch, сеансы - /api/v1/sessions)
+    # и асинхронные задания (/jobs)
+    app.register_blueprint(api)
+    app.register_blueprint(batch)
+    app.register_blueprint(sessions)
+    app.register_blueprint(jobs)
+    
+    # Время этапов (Server-Timing), метрики Prometheus (/metrics) и профилирование
+    app.register_blueprint(metrics)
+    
+    # Проверки живости и готовности (/healthz, /readyz)
+    app.register_blueprint(health)
+    
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/process', view_func=process, methods=['POST'])
+    app.add_url_rule('/result/<source_key>', view_func=full_result)
+    
+    # Создаем папку для временных файлов крупных загрузок
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    
+    start_warmup(app, startup_seconds=time.perf_counter() - start)
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
     app.run(debug=True, host='127.0.0.1', port=5000)
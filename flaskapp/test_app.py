@@ -121,6 +121,397 @@ def create_test_image():
         print(f"✗ Ошибка создания изображения: {e}")
         return False
 
+def test_shift_engine():
+    """Проверяет, что векторизованный сдвиг совпадает с эталонной реализацией"""
+    print_header("ПРОВЕРКА ДВИЖКА СДВИГА")
+    
+    import numpy as np
+    from ring_shift import shift_image_rectangular, shift_image_rectangular_loop
+    
+    rng = np.random.default_rng(20)
+    cases = [
+        ((1, 1, 3), 5), ((1, 7, 3), 3), ((2, 2), 1), ((5, 8, 3), 7),
+        ((9, 4, 4), -3), ((16, 16), 0), ((31, 17, 3), 1000), ((40, 25), 123),
+    ]
+    
+    failures = []
+    for shape, shift in cases:
+        for dtype in (np.uint8, np.uint16, np.float32):
+            image = (rng.random(shape) * 255).astype(dtype)
+            expected = shift_image_rectangular_loop(image, shift)
+            actual = shift_image_rectangular(image, shift)
+            if actual.dtype != expected.dtype or not np.array_equal(actual, expected):
+                failures.append((shape, shift, np.dtype(dtype).name))
+    
+    for case in failures:
+        print(f"✗ Расхождение: размер {case[0]}, сдвиг {case[1]}, тип {case[2]}")
+    assert not failures, "векторизованный сдвиг расходится с эталоном"
+    
+    print(f"✓ Совпадение с эталоном на {len(cases) * 3} случаях")
+    
+    # Сдвиг объявлен сохраняющим гистограмму - проверяем это
+    from histogram import compute_histogram
+    from operations import HISTOGRAM, get_operation
+    
+    operation = get_operation('ring_shift')
+    image = rng.integers(0, 256, (37, 23, 3), dtype=np.uint8)
+    assert operation.preserves(HISTOGRAM)
+    assert np.array_equal(compute_histogram(image), compute_histogram(operation(image, 7)))
+    print("✓ Гистограмма сохраняется при сдвиге")
+
+    # Сдвиг на месте группами контуров (режим out_of_core) дает тот же результат
+    from out_of_core import ring_shift_inplace
+
+    for shape, shift in cases:
+        image = rng.integers(0, 256, shape, dtype=np.uint8)
+        for band in (1, 3, 64):
+            assert np.array_equal(ring_shift_inplace(image.copy(), shift, band),
+                                  operation(image, shift)), (shape, shift, band)
+    print("✓ Сдвиг на месте совпадает с движком")
+
+    # Обобщенные режимы: обратное преобразование возвращает исходное изображение
+    from ring_shift import apply_ring_transform
+
+    # (на 300x400 НОК периметров не помещается в int64 - отрицательные сдвиги
+    # приводятся по контурам)
+    for shape in ((31, 17, 3), (300, 400, 3)):
+        image = rng.integers(0, 256, shape, dtype=np.uint8)
+        for mode, clockwise in (('constant', True), ('constant', False),
+                                ('proportional', True), ('proportional', False)):
+            result = apply_ring_transform(image, 9, mode, clockwise)
+            assert np.array_equal(apply_ring_transform(result, 9, mode, clockwise, inverse=True), image)
+        assert np.array_equal(apply_ring_transform(image, 5, clockwise=False),
+                              shift_image_rectangular_loop(image, -5))
+    print("✓ Обратный сдвиг восстанавливает изображение")
+
+    # Альфа-канал декодируется и сдвигается вместе с цветом
+    import io
+    from PIL import Image
+    from imaging import image_to_array
+
+    image = rng.integers(0, 256, (20, 30, 4), dtype=np.uint8)
+    buffered = io.BytesIO()
+    Image.fromarray(image).save(buffered, format='PNG')
+    decoded = image_to_array(Image.open(buffered))
+    assert decoded.shape == image.shape and np.array_equal(decoded, image)
+    assert np.array_equal(operation(decoded, 5), shift_image_rectangular_loop(image, 5))
+    print("✓ RGBA сохраняет альфа-канал")
+    
+    # Декодирование полосами совпадает с np.asarray для всех режимов,
+    # в том числе в массив во временном файле (out_of_core)
+    from imaging import decode_to_array
+    from out_of_core import scratch_array
+    
+    gray16 = rng.integers(0, 65536, (23, 37), dtype=np.uint16)
+    images = [Image.fromarray(rng.integers(0, 256, (23, 37, 4), dtype=np.uint8)).convert(mode)
+              for mode in ('L', 'LA', 'RGB', 'RGBA')]
+    images += [Image.fromarray(gray16.astype(np.int32)), Image.fromarray(gray16),
+               Image.frombytes('I;16B', (37, 23), gray16.astype('>u2').tobytes())]
+    for img in images:
+        for allocate in (np.empty, scratch_array):
+            decoded = decode_to_array(img, allocate, strip_bytes=100)
+            assert decoded.dtype == np.asarray(img).dtype and np.array_equal(decoded, np.asarray(img)), img.mode
+    print("✓ Декодирование полосами совпадает с np.asarray")
+    
+    # 16-битный grayscale в режиме 'I' (int32, так его декодирует Pillow 8)
+    # записывается потоковым PNG как 16-битный
+    from imaging import iter_png, png_supports
+    
+    for array in (gray16.astype(np.int32), gray16):
+        assert png_supports(array)
+        encoded = Image.open(io.BytesIO(b''.join(iter_png(array, strip_bytes=100))))
+        assert np.array_equal(np.asarray(encoded).astype(np.int64), gray16), array.dtype
+    assert not png_supports(np.full((2, 2), 70000, dtype=np.int32))
+    assert not png_supports(np.zeros((2, 2), dtype=np.float32))
+    print("✓ Потоковый PNG пишет 16-битный grayscale из int32")
+    return True
+
+def test_animation():
+    """Проверяет кадры анимации, в том числе для 16-битного grayscale"""
+    print_header("ПРОВЕРКА АНИМАЦИИ")
+    
+    import io
+    import numpy as np
+    from PIL import Image, ImageSequence
+    from animation import encode_animation
+    from ring_shift import apply_ring_shift
+    
+    # 16-битные данные приходят как uint16 (I;16) или как int32 (режим 'I')
+    gradient = np.linspace(0, 65535, 40 * 60).reshape(40, 60)
+    for dtype in (np.uint16, np.int32):
+        image = gradient.astype(dtype)
+        data = encode_animation(image, 3, 4, 'apng')
+        frames = [np.asarray(frame.convert('L')) for frame in ImageSequence.Iterator(Image.open(io.BytesIO(data)))]
+        assert len(frames) == 4
+        for k, frame in enumerate(frames):
+            expected = (apply_ring_shift(image, 3 * k) >> 8).astype(np.uint8)
+            assert np.array_equal(frame, expected), (np.dtype(dtype).name, k)
+    print("✓ 16-битные кадры сужаются до 8 бит без потери диапазона")
+    return True
+
+def test_jobs():
+    """Проверяет задание /jobs в пуле процессов при работающих потоках движка"""
+    print_header("ПРОВЕРКА ЗАДАНИЙ")
+    
+    import io
+    import numpy as np
+    from PIL import Image
+    from ring_shift import apply_ring_shift, shift_executor
+    from some_app import create_app
+    
+    app = create_app({'SHIFT_WORKERS': 2, 'JOB_EXECUTOR': 'process', 'JOB_WORKERS': 1, 'WARMUP': 'off'})
+    client = app.test_client()
+    try:
+        # Потоки движка запущены до того, как пул заданий делает fork
+        image = np.random.default_rng(9).integers(0, 256, (1100, 1100, 3), dtype=np.uint8)
+        apply_ring_shift(image, 3)
+        buffered = io.BytesIO()
+        Image.fromarray(image).save(buffered, format='PNG', compress_level=1)
+        
+        response = client.post('/jobs?shift=5', data={'image': (io.BytesIO(buffered.getvalue()), 'big.png')})
+        assert response.status_code == 202, response.get_json()
+        info = client.get(f"{response.get_json()['status_url']}?wait=30").get_json()
+        assert info['status'] == 'done', info
+        result = np.asarray(Image.open(io.BytesIO(client.get(info['result_url']).data)))
+        assert np.array_equal(result, apply_ring_shift(image, 5))
+        
+        # Задание с истекшим таймаутом прерывается и освобождает воркер,
+        # даже если очередь никто не опрашивает
+        from concurrent import futures
+        from jobs import JobQueue, ProcessJobExecutor
+        
+        limited = JobQueue(ProcessJobExecutor(1), 4, 0.5, 60)
+        stuck = limited.submit(time.sleep, 60)
+        futures.wait([stuck.future], timeout=10)
+        assert stuck.future.done() and stuck.status == 'timeout'
+        following = limited.submit(sum, [1, 2, 3])
+        assert following.future.result(timeout=30) == 6
+        assert limited.pending() == 0 and stuck.future.done()
+        limited.shutdown()
+    finally:
+        queue = app.extensions.get('job_queue')
+        if queue is not None:
+            queue.shutdown()
+        shift_executor.configure(1)
+    print("✓ Задание 1100x1100 выполнено при SHIFT_WORKERS=2")
+    print("✓ Задание с истекшим таймаутом прервано")
+    return True
+
+def test_full_result():
+    """Проверяет выдачу полного разрешения /result/<key>"""
+    print_header("ПРОВЕРКА /result")
+    
+    import io
+    import re
+    import numpy as np
+    from PIL import Image
+    from result_cache import content_key, result_cache
+    from ring_shift import apply_ring_shift
+    from some_app import create_app
+    
+    app = create_app({'WARMUP': 'off', 'MAX_IMAGE_PIXELS': 5000})
+    client = app.test_client()
+    
+    image = np.random.default_rng(12).integers(0, 256, (40, 60, 3), dtype=np.uint8)
+    buffered = io.BytesIO()
+    Image.fromarray(image).save(buffered, format='PNG')
+    data = buffered.getvalue()
+    
+    response = client.post('/process', data={'image': (io.BytesIO(data), 'small.png'), 'shift_pixels': '4',
+                                             'output': 'png'})
+    assert response.status_code == 200
+    full_url = re.search(r'href="(/result/[^"]+)"', response.get_data(as_text=True)).group(1).replace('&amp;', '&')
+    response = client.get(full_url)
+    assert response.status_code == 200 and response.mimetype == 'image/png'
+    assert np.array_equal(np.asarray(Image.open(io.BytesIO(response.data))), apply_ring_shift(image, 4))
+    
+    # Страница сдвигает уменьшенную копию на сдвиг в ее масштабе
+    import base64
+    from imaging import make_preview
+    
+    preview_client = create_app({'WARMUP': 'off', 'PREVIEW_MAX_SIZE': 30}).test_client()
+    response = preview_client.post('/process', data={'image': (io.BytesIO(data), 'small.png'),
+                                                     'shift_pixels': '4', 'output': 'png'})
+    page = response.get_data(as_text=True)
+    result_b64 = re.findall(r'data:image/png;base64,([^"]+)"', page)[1]
+    preview = np.asarray(make_preview(Image.fromarray(image), 30))
+    assert np.array_equal(np.asarray(Image.open(io.BytesIO(base64.b64decode(result_b64)))),
+                          apply_ring_shift(preview, 2))
+    assert '60x40' in page
+    
+    # Ключ не из кэша, не hex или не ASCII - 404, а не ошибка сервера
+    for key in ('0' * 32, 'not-a-key', 'ключ', 'A' * 32):
+        assert client.get(f'/result/{key}?shift=4').status_code == 404, key
+    
+    # Не декодированная загрузка не сохраняется; сохраненная, но больше
+    # бюджета пикселей - 413
+    large = io.BytesIO()
+    Image.new('RGB', (100, 100)).save(large, format='PNG')
+    source_key = content_key(io.BytesIO(large.getvalue()), 'source')
+    response = client.post('/process', data={'image': (io.BytesIO(large.getvalue()), 'large.png')})
+    assert response.status_code == 413 and not result_cache.contains(source_key)
+    result_cache.put(source_key, large.getvalue())
+    assert client.get(f'/result/{source_key}?shift=1').status_code == 413
+    print("✓ /result отдает результат, 404 на неизвестный ключ и 413 на слишком большое изображение")
+    
+    # Источник больше бюджета памяти копируется порциями на диск; дисковый
+    # уровень держится в своем бюджете без полного сканирования на каждую запись
+    import tempfile
+    from result_cache import ResultCache
+    
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResultCache(1024, directory, 5 * 1024 * 1024)
+        source = np.random.default_rng(13).bytes(3 * 1024 * 1024 + 17)
+        stream = io.BytesIO(source)
+        stream.seek(100)
+        cache.put_stream('a' * 32, stream)
+        assert stream.tell() == 0 and cache.stats()['entries'] == 0
+        assert cache.get('a' * 32) == source
+        for k in range(4):
+            cache.put_stream(f'{k:032x}', io.BytesIO(source[:1024 * 1024]))
+        total = sum(entry.stat().st_size for entry in os.scandir(directory))
+        assert total <= 5 * 1024 * 1024 and cache.get(f'{3:032x}') == source[:1024 * 1024]
+    print("✓ Кэш копирует крупный источник на диск порциями и соблюдает бюджет диска")
+    return True
+
+def test_async_adapter():
+    """Проверяет ASGI-адаптер сообщениями ASGI: тело порциями, 400, 413 и 503"""
+    print_header("ПРОВЕРКА ASGI-АДАПТЕРА")
+    
+    import asyncio
+    import io
+    import numpy as np
+    from PIL import Image
+    from async_adapter import AsyncWsgiAdapter
+    from ring_shift import apply_ring_shift
+    from some_app import create_app
+    
+    app = create_app({'WARMUP': 'off', 'ASYNC_WORKERS': 2, 'ASYNC_MAX_REQUESTS': 1,
+                      'ASYNC_QUEUE_TIMEOUT': 0.2, 'MAX_CONTENT_LENGTH': 1024 * 1024})
+    adapter = AsyncWsgiAdapter(app)
+    
+    image = np.random.default_rng(21).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    buffered = io.BytesIO()
+    Image.fromarray(image).save(buffered, format='PNG')
+    data = buffered.getvalue()
+    chunks = [data[i:i + 4096] for i in range(0, len(data), 4096)]
+    
+    def scope(length=None):
+        headers = [(b'content-type', b'application/octet-stream')]
+        if length is not None:
+            headers.append((b'content-length', length))
+        return {'type': 'http', 'method': 'POST', 'path': '/api/v1/shift', 'root_path': '',
+                'query_string': b'shift=5&format=raw', 'http_version': '1.1', 'headers': headers}
+    
+    async def call(scope, chunks, release=None):
+        """Запрос с телом chunks; release задерживает чтение ответа (медленный клиент)."""
+        messages = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+                    for i, chunk in enumerate(chunks)]
+        sent = []
+        
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+        
+        async def send(message):
+            sent.append(message)
+            if release is not None and message['type'] == 'http.response.body':
+                await release.wait()
+        
+        await adapter(scope, receive, send)
+        return sent[0]['status'], b''.join(message.get('body', b'') for message in sent[1:])
+    
+    async def scenario():
+        # Тело из нескольких порций собирается и передается приложению целиком
+        status, body = await call(scope(str(len(data)).encode()), chunks)
+        assert status == 200
+        assert np.array_equal(np.frombuffer(body, np.uint8).reshape(image.shape), apply_ring_shift(image, 5))
+        
+        # Некорректный Content-Length - 400, слишком большое тело - 413
+        # (по заголовку или по фактически полученным байтам)
+        assert (await call(scope(b'12abc'), chunks))[0] == 400
+        assert (await call(scope(b'%d' % (2 * 1024 * 1024)), chunks))[0] == 413
+        assert (await call(scope(), [b'\0' * 600 * 1024] * 2))[0] == 413
+        
+        # Единственное место занято медленным клиентом - следующий запрос ждет
+        # ASYNC_QUEUE_TIMEOUT и получает 503
+        release = asyncio.Event()
+        slow = asyncio.create_task(call(scope(), chunks, release))
+        while adapter.stats()['active'] == 0:
+            await asyncio.sleep(0.01)
+        assert (await call(scope(), chunks))[0] == 503
+        release.set()
+        assert (await slow)[0] == 200
+        assert adapter.stats() == {'active': 0, 'waiting': 0, 'rejected': 1}
+    
+    try:
+        asyncio.run(scenario())
+    finally:
+        adapter.executor.shutdown()
+    print("✓ Адаптер собирает тело порциями и отвечает 400, 413 и 503")
+    return True
+
+def test_api_arguments():
+    """Проверяет разбор параметров API на крайних значениях"""
+    print_header("ПРОВЕРКА ПАРАМЕТРОВ API")
+    
+    import io
+    import numpy as np
+    from PIL import Image
+    from ring_shift import apply_ring_transform, ring_lengths, ring_shifts
+    from some_app import create_app
+    
+    client = create_app({'WARMUP': 'off'}).test_client()
+    image = np.random.default_rng(19).integers(0, 256, (30, 40, 3), dtype=np.uint8)
+    buffered = io.BytesIO()
+    Image.fromarray(image).save(buffered, format='PNG')
+    data = buffered.getvalue()
+    
+    # Сдвиги за пределами int64 приводятся по модулю периметра, а не ломают запрос
+    lengths = ring_lengths(30, 40)
+    huge = [10 ** 30 + k for k in range(len(lengths))]
+    assert np.array_equal(ring_shifts(30, 40, huge, 'array'), [s % n for s, n in zip(huge, lengths)])
+    assert np.array_equal(ring_shifts(30, 40, 10 ** 30, 'proportional', False),
+                          ring_shifts(30, 40, 10 ** 30 % (2 * lengths[0]), 'proportional', False))
+    response = client.post('/api/v1/shift?format=raw&mode=array&shifts=' + ','.join(map(str, huge)),
+                           data=data, content_type='application/octet-stream')
+    assert response.status_code == 200, response.get_json()
+    assert np.array_equal(np.frombuffer(response.data, np.uint8).reshape(image.shape),
+                          apply_ring_transform(image, huge, 'array'))
+    
+    # Огромные delta и shift сеанса (и по контурам) приводятся по периоду
+    from sessions import reduce_shift
+    
+    response = client.post('/api/v1/sessions?shift=2', data=data, content_type='image/png')
+    shift_url = response.get_json()['shift_url']
+    response = client.post(f'{shift_url}?format=raw&delta=-3')
+    assert response.status_code == 200 and response.headers['X-Shift-Pixels'] == '-1'
+    response = client.post(f'{shift_url}?format=raw&delta={10 ** 30}&mode=proportional')
+    assert response.status_code == 200
+    response = client.post(f'{shift_url}?format=raw&delta={10 ** 30}')
+    assert response.status_code == 200
+    expected = apply_ring_transform(image, -1)
+    expected = apply_ring_transform(expected, reduce_shift(30, 40, 10 ** 30), 'proportional')
+    expected = apply_ring_transform(expected, 10 ** 30)
+    assert np.array_equal(np.frombuffer(response.data, np.uint8).reshape(image.shape), expected)
+    response = client.post(f'{shift_url}?format=raw&shift={-10 ** 30}')
+    assert response.status_code == 200
+    assert np.array_equal(np.frombuffer(response.data, np.uint8).reshape(image.shape),
+                          apply_ring_transform(image, -10 ** 30))
+    print("✓ Сдвиги вне диапазона int64 обрабатываются")
+    
+    # Анимация учитывает inverse, отрицательный max_size отклоняется
+    from PIL import ImageSequence
+    
+    response = client.post('/api/v1/animate?format=apng&shift=3&frames=2&inverse=1',
+                           data=data, content_type='image/png')
+    assert response.status_code == 200
+    frames = [np.asarray(frame.convert('RGB')) for frame in ImageSequence.Iterator(Image.open(io.BytesIO(response.data)))]
+    assert np.array_equal(frames[1], apply_ring_transform(image, 3, inverse=True))
+    for url in ('/api/v1/shift?max_size=-1', '/api/v1/animate?max_size=-5', '/api/v1/sessions?max_size=-1'):
+        assert client.post(url, data=data, content_type='image/png').status_code == 400, url
+    print("✓ inverse в анимации и проверка max_size")
+    return True
+
 def test_flask_server():
     """Тестирует Flask сервер"""
     print_header("ТЕСТИРОВАНИЕ FLASK СЕРВЕРА")
@@ -215,6 +606,36 @@ def main():
         print("\n✗ Ошибка создания тестового изображения!")
         return 1
     
+    # Проверяем движок сдвига
+    if not test_shift_engine():
+        print("\n✗ Проверка движка сдвига не пройдена!")
+        return 1
+    
+    # Проверяем анимацию
+    if not test_animation():
+        print("\n✗ Проверка анимации не пройдена!")
+        return 1
+    
+    # Проверяем задания в пуле процессов
+    if not test_jobs():
+        print("\n✗ Проверка заданий не пройдена!")
+        return 1
+    
+    # Проверяем выдачу полного разрешения
+    if not test_full_result():
+        print("\n✗ Проверка /result не пройдена!")
+        return 1
+    
+    # Проверяем ASGI-адаптер
+    if not test_async_adapter():
+        print("\n✗ Проверка ASGI-адаптера не пройдена!")
+        return 1
+    
+    # Проверяем параметры API
+    if not test_api_arguments():
+        print("\n✗ Проверка параметров API не пройдена!")
+        return 1
+    
     # Тестируем Flask сервер
     if not test_flask_server():
         print("\n✗ Тестирование сервера не пройдено!")